@@ -0,0 +1,352 @@
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import queue
+import time
+from datetime import datetime
+
+import databaseOperate
+import searchIndex
+
+# 大量匯入 / 匯出文章：透過 COPY FROM STDIN / COPY TO STDOUT 串流，不逐筆呼叫 create_post
+# 匯入每 chunk_rows 筆為一個交易：COPY 進暫存表 → 依 username 對應作者後 INSERT 進 posts
+# → 同一交易內更新 bulk_import_checkpoints 的檔案位置，中斷後以同一個 job 名稱重跑即可從斷點繼續
+IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", "5000"))
+FORMATS = ("ndjson", "csv")
+
+_STAGE_SQL = """
+    CREATE TEMP TABLE IF NOT EXISTS post_import_stage (
+        title text, content text, username text, board_id integer, tags jsonb,
+        created_at timestamptz, excerpt text, text_length integer, title_doc text, body_doc text
+    ) ON COMMIT DELETE ROWS
+"""
+_STAGE_COPY_SQL = """
+    COPY post_import_stage (title, content, username, board_id, tags, created_at, excerpt, text_length,
+                            title_doc, body_doc)
+    FROM STDIN
+"""
+_STAGE_INSERT_SQL = f"""
+    INSERT INTO posts (title, content, user_id, board_id, tags, created_at, updated_at,
+                       search_vector, excerpt, content_length, hot_score)
+    SELECT s.title, s.content, u.user_id, s.board_id, s.tags,
+           COALESCE(s.created_at, CURRENT_TIMESTAMP), COALESCE(s.created_at, CURRENT_TIMESTAMP),
+           setweight(to_tsvector('simple', s.title_doc), 'A') ||
+           setweight(to_tsvector('simple', s.body_doc), 'B'),
+           s.excerpt, s.text_length,
+           {databaseOperate.hot_score_sql("0", "COALESCE(s.created_at, CURRENT_TIMESTAMP)")}
+    FROM post_import_stage s
+    JOIN users u ON u.username = s.username
+"""
+_CHECKPOINT_SQL = """
+    INSERT INTO bulk_import_checkpoints (job, source, byte_offset, rows_read, rows_imported, rows_skipped)
+    VALUES (%(job)s, %(source)s, %(offset)s, %(read)s, %(imported)s, %(skipped)s)
+    ON CONFLICT (job) DO UPDATE
+    SET byte_offset = EXCLUDED.byte_offset,
+        rows_read = EXCLUDED.rows_read,
+        rows_imported = EXCLUDED.rows_imported,
+        rows_skipped = EXCLUDED.rows_skipped,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+def read_records(f, fmt: str, start: int = 0):
+    """
+    逐筆讀取 NDJSON / CSV (f 需以二進位模式開啟)，產生 (紀錄 dict, 該筆結束後的檔案位置)
+    start 為上次的斷點位置；CSV 會先讀標頭再跳到斷點
+    """
+    if fmt == "ndjson":
+        f.seek(start)
+        for line in f:
+            if line.strip():
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                yield record, f.tell()
+        return
+
+    first = f.readline()
+    if not first:
+        return
+    header = next(csv.reader([first.decode("utf-8")]))
+    if start:
+        f.seek(start)
+    # csv.reader 依需要逐行拉取 (欄位內可能有換行)，每產生一筆時 f.tell() 恰好在該筆結尾
+    reader = csv.reader(line.decode("utf-8") for line in f)
+    for row in reader:
+        if row:
+            yield dict(zip(header, row)), f.tell()
+
+def _copy_field(value) -> str:
+    """
+    轉成 COPY text 格式的欄位 (NULL 為 \\N，反斜線與 tab / 換行需跳脫)
+    """
+    if value is None:
+        return "\\N"
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+def to_stage_line(record: dict):
+    """
+    將一筆匯入紀錄轉成暫存表的一行；缺少必要欄位或格式錯誤時回傳 None (計入略過筆數)
+    摘要與全文檢索文件在這裡先算好，與 create_post 寫入的內容一致
+    """
+    title = record.get("title")
+    content = record.get("content")
+    username = record.get("username")
+    if not all(isinstance(value, str) and value for value in (title, content, username)):
+        return None
+    try:
+        board_id = record.get("board_id")
+        board_id = int(board_id) if board_id not in (None, "") else None
+        tags = record.get("tags") or []
+        if isinstance(tags, str):
+            tags = json.loads(tags)
+        if not isinstance(tags, list):
+            return None
+        created_at = record.get("created_at") or None
+        if created_at:
+            created_at = datetime.fromisoformat(str(created_at)).isoformat()
+        plain_text = searchIndex.html_to_text(content)
+        fields = (
+            title[:255], content, username, board_id, json.dumps(tags, ensure_ascii=False), created_at,
+            plain_text[:databaseOperate.EXCERPT_LENGTH], len(plain_text),
+            searchIndex.to_document(title), searchIndex.to_document(plain_text)
+        )
+    except (TypeError, ValueError):
+        return None
+    return "\t".join(_copy_field(v) for v in fields) + "\n"
+
+def load_checkpoint(conn, job: str):
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT source, byte_offset, rows_read, rows_imported, rows_skipped "
+            "FROM bulk_import_checkpoints WHERE job = %s", (job,)
+        )
+        return cur.fetchone()
+
+def import_posts(path: str, fmt: str, job: str, source: str = None, chunk_rows: int = IMPORT_CHUNK_ROWS,
+                 progress=None) -> dict:
+    """
+    由 path 匯入文章，記憶體用量只跟 chunk_rows 有關
+    每個 chunk 與其斷點在同一個交易內 commit，重跑時從上次 commit 的位置繼續，不會重複匯入
+    作者以 username 對應，找不到的使用者與格式錯誤的紀錄都計入 rows_skipped
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {FORMATS}")
+    source = source or os.path.abspath(path)
+    databaseOperate.init_engines()
+    conn = databaseOperate.engine.raw_connection()
+    start = time.perf_counter()
+    try:
+        checkpoint = load_checkpoint(conn, job)
+        if checkpoint and checkpoint[0] != source:
+            raise ValueError(f"job '{job}' belongs to {checkpoint[0]}, not {source}")
+        offset, rows_read, imported, skipped = checkpoint[1:] if checkpoint else (0, 0, 0, 0)
+        resumed_from = offset
+        imported_before = imported
+
+        with conn.cursor() as cur:
+            cur.execute(_STAGE_SQL)
+        conn.commit()
+
+        with open(path, "rb") as f:
+            records = read_records(f, fmt, offset)
+            while True:
+                buffer = io.StringIO()
+                staged = 0
+                read = 0
+                for record, position in records:
+                    read += 1
+                    offset = position
+                    line = to_stage_line(record) if isinstance(record, dict) else None
+                    if line is None:
+                        skipped += 1
+                    else:
+                        buffer.write(line)
+                        staged += 1
+                    if read >= chunk_rows:
+                        break
+                if read == 0:
+                    break
+
+                buffer.seek(0)
+                with conn.cursor() as cur:
+                    # 中途當機時這個 chunk 與斷點一起遺失，重跑會再匯入一次，所以可以放寬 fsync
+                    cur.execute("SET LOCAL synchronous_commit = off")
+                    cur.copy_expert(_STAGE_COPY_SQL, buffer)
+                    cur.execute(_STAGE_INSERT_SQL)
+                    inserted = cur.rowcount
+                    rows_read += read
+                    imported += inserted
+                    skipped += staged - inserted
+                    cur.execute(_CHECKPOINT_SQL, {
+                        "job": job, "source": source, "offset": offset,
+                        "read": rows_read, "imported": imported, "skipped": skipped
+                    })
+                conn.commit()
+                if progress:
+                    elapsed = time.perf_counter() - start
+                    progress(f"{job}: {rows_read} read, {imported} imported, {skipped} skipped "
+                             f"({(imported - imported_before) / elapsed:.0f} rows/sec)")
+                if read < chunk_rows:
+                    break
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "job": job,
+        "resumed_from": resumed_from,
+        "byte_offset": offset,
+        "rows_read": rows_read,
+        "rows_imported": imported,
+        "rows_skipped": skipped,
+        "elapsed_sec": round(elapsed, 3)
+    }
+
+def _export_sql(cur, fmt: str, board_id: int = None) -> str:
+    where = cur.mogrify("WHERE p.board_id = %s", (board_id,)).decode() if board_id is not None else ""
+    if fmt == "csv":
+        return f"""
+            COPY (
+                SELECT p.id, p.title, p.content, u.username, p.board_id, p.tags, p.created_at
+                FROM posts p JOIN users u ON u.user_id = p.user_id
+                {where}
+                ORDER BY p.id
+            ) TO STDOUT WITH (FORMAT csv, HEADER)
+        """
+    # JSON 內的換行與控制字元都已跳脫；以不會出現的字元作為 CSV 引號與分隔符號，輸出即為原樣的 NDJSON
+    return f"""
+        COPY (
+            SELECT json_build_object(
+                'id', p.id, 'title', p.title, 'content', p.content, 'username', u.username,
+                'board_id', p.board_id, 'tags', p.tags, 'created_at', p.created_at
+            )
+            FROM posts p JOIN users u ON u.user_id = p.user_id
+            {where}
+            ORDER BY p.id
+        ) TO STDOUT WITH (FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02')
+    """
+
+def export_posts(out, fmt: str, board_id: int = None):
+    """
+    以 COPY TO STDOUT 將文章串流寫入 out (需有 write(bytes))，資料不經過 Python 物件
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {FORMATS}")
+    databaseOperate.init_engines()
+    conn = databaseOperate.engine.raw_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.copy_expert(_export_sql(cur, fmt, board_id), out)
+        conn.commit()
+    finally:
+        conn.close()
+
+_EXPORT_DONE = object()
+
+class _QueueWriter:
+    """
+    COPY 執行緒寫入的檔案介面，資料放進有上限的佇列 (客戶端讀得慢時 COPY 也跟著等待)
+    """
+    def __init__(self, chunks: queue.Queue):
+        self.chunks = chunks
+        self.cancelled = False
+
+    def _put(self, item):
+        while not self.cancelled:
+            try:
+                self.chunks.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def write(self, data):
+        if not self._put(bytes(data)):
+            raise IOError("export cancelled")
+
+    def close(self):
+        self._put(_EXPORT_DONE)
+
+    def wake_reader(self):
+        """
+        取消後呼叫：清出空位放入結束標記，讓卡在 chunks.get() 的讀取執行緒返回
+        """
+        while True:
+            try:
+                self.chunks.put_nowait(_EXPORT_DONE)
+                return
+            except queue.Full:
+                try:
+                    self.chunks.get_nowait()
+                except queue.Empty:
+                    pass
+
+async def stream_export(fmt: str, board_id: int = None, max_chunks: int = 64):
+    """
+    給 StreamingResponse 使用：COPY 在背景執行緒執行，逐塊產生輸出
+    """
+    chunks = queue.Queue(maxsize=max_chunks)
+    writer = _QueueWriter(chunks)
+
+    def run():
+        try:
+            export_posts(writer, fmt, board_id)
+        except IOError:
+            if not writer.cancelled:
+                raise
+        finally:
+            writer.close()
+
+    task = asyncio.ensure_future(asyncio.to_thread(run))
+    try:
+        while True:
+            chunk = await asyncio.to_thread(chunks.get)
+            if chunk is _EXPORT_DONE:
+                break
+            yield chunk
+        await task
+    finally:
+        # 客戶端中途斷線時讓 COPY 執行緒停止寫入；此時可能還有一個 to_thread(chunks.get) 在等資料，
+        # COPY 執行緒取消後不會再放入任何東西，所以由這裡放結束標記喚醒它，否則該執行緒永遠不會結束
+        writer.cancelled = True
+        writer.wake_reader()
+        # 斷線時 COPY 工作還沒結束：取消並等待，不留下沒人取回結果的 task (執行緒看到 cancelled 後會自行結束)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="以 COPY 串流大量匯入 / 匯出文章 (NDJSON 或 CSV)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_import = sub.add_parser("import", help="匯入文章 (作者以 username 對應)")
+    p_import.add_argument("path", help="NDJSON 或 CSV 檔案")
+    p_import.add_argument("--format", choices=FORMATS, default="ndjson")
+    p_import.add_argument("--job", help="斷點名稱 (預設為檔名)，中斷後以相同名稱重跑會從斷點繼續")
+    p_import.add_argument("--chunk", type=int, default=IMPORT_CHUNK_ROWS, help="每個交易匯入的筆數")
+
+    p_export = sub.add_parser("export", help="匯出文章")
+    p_export.add_argument("path", help="輸出檔案，- 代表標準輸出")
+    p_export.add_argument("--format", choices=FORMATS, default="ndjson")
+    p_export.add_argument("--board-id", type=int, help="只匯出指定看板")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        report = import_posts(args.path, args.format, args.job or os.path.basename(args.path),
+                              chunk_rows=args.chunk, progress=print)
+        for key, value in report.items():
+            print(f"{key}: {value}")
+    else:
+        import sys
+        if args.path == "-":
+            export_posts(sys.stdout.buffer, args.format, args.board_id)
+        else:
+            with open(args.path, "wb") as out:
+                export_posts(out, args.format, args.board_id)
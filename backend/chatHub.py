@@ -0,0 +1,336 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+import tracemalloc
+
+class Broker:
+    """
+    跨 worker 轉送房間訊息的介面
+    start() 時註冊 handler(room, message)，之後每個 publish() 出去的訊息
+    (包含自己這個 worker 發出的) 都會透過 handler 回到各 worker 的 Hub
+    """
+    async def start(self, handler):
+        raise NotImplementedError
+
+    async def publish(self, room: str, message: dict):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+class InMemoryBroker(Broker):
+    """
+    單一 process 用的 Broker (開發環境、測試或只有一個 worker 時)
+    """
+    def __init__(self):
+        self._handler = None
+
+    async def start(self, handler):
+        self._handler = handler
+
+    async def publish(self, room: str, message: dict):
+        if self._handler:
+            self._handler(room, message)
+
+class BrokerUnavailable(Exception):
+    """
+    Broker 暫時無法發佈 (例如與 PostgreSQL 的連線中斷、正在重新連線)，呼叫端應告知使用者稍後再試
+    """
+
+class PostgresBroker(Broker):
+    """
+    以 PostgreSQL LISTEN/NOTIFY 轉送訊息，讓多個 uvicorn worker 共用房間
+    (NOTIFY 的 payload 上限約 8000 bytes，訊息長度需在呼叫端限制)
+    連線中斷時在背景以指數退避 (加上隨機抖動) 重新連線並重新 LISTEN；
+    中斷期間 publish() 拋出 BrokerUnavailable，也收不到其他 worker 的訊息 (NOTIFY 不會補送)
+    """
+    def __init__(self, dsn: str, channel: str = "forum_chat",
+                 backoff_base: float = 0.5, backoff_max: float = 30.0):
+        self.dsn = dsn
+        self.channel = channel
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._conn = None
+        self._handler = None
+        self._lock = asyncio.Lock()
+        self._reconnect_task = None
+        self._closing = False
+        self.reconnects = 0
+        self.publish_failures = 0
+
+    async def start(self, handler):
+        self._handler = handler
+        self._closing = False
+        try:
+            await self._connect()
+        except Exception as e:
+            # 啟動時資料庫還沒準備好也不讓 worker 啟動失敗，改在背景重試
+            print(f"Broker {self.channel} connect failed, retrying in background: {e}")
+            self._schedule_reconnect()
+
+    async def _connect(self):
+        import asyncpg
+
+        conn = await asyncpg.connect(self.dsn)
+        try:
+            await conn.add_listener(self.channel, self._on_notify)
+            conn.add_termination_listener(self._on_terminated)
+        except BaseException:
+            await conn.close()
+            raise
+        self._conn = conn
+
+    def _on_terminated(self, conn):
+        if conn is self._conn:
+            self._conn = None
+            self._schedule_reconnect()
+
+    def _schedule_reconnect(self):
+        if self._closing or (self._reconnect_task is not None and not self._reconnect_task.done()):
+            return
+        self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self):
+        attempt = 0
+        while not self._closing:
+            delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+            attempt += 1
+            try:
+                await self._connect()
+            except Exception as e:
+                print(f"Broker {self.channel} reconnect attempt {attempt} failed: {e}")
+                continue
+            self.reconnects += 1
+            print(f"Broker {self.channel} reconnected after {attempt} attempt(s)")
+            return
+
+    def _on_notify(self, conn, pid, channel, payload):
+        try:
+            data = json.loads(payload)
+            self._handler(data["room"], data["message"])
+        except Exception as e:
+            print(f"Broker message dropped: {e}")
+
+    async def publish(self, room: str, message: dict):
+        payload = json.dumps({"room": room, "message": message}, ensure_ascii=False)
+        # 同一條 asyncpg 連線不能同時執行多個查詢
+        async with self._lock:
+            conn = self._conn
+            if conn is None or conn.is_closed():
+                self.publish_failures += 1
+                self._schedule_reconnect()
+                raise BrokerUnavailable(f"broker {self.channel} is reconnecting")
+            try:
+                await conn.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+            except (OSError, asyncio.TimeoutError) as e:
+                # socket 層級的錯誤：這條連線不可靠了，直接丟掉重連
+                conn.terminate()
+                self.publish_failures += 1
+                self._on_terminated(conn)
+                raise BrokerUnavailable(str(e)) from e
+            except Exception as e:
+                if not conn.is_closed():
+                    raise
+                self.publish_failures += 1
+                self._on_terminated(conn)
+                raise BrokerUnavailable(str(e)) from e
+
+    async def close(self):
+        self._closing = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            try:
+                await self._reconnect_task
+            except asyncio.CancelledError:
+                pass
+            self._reconnect_task = None
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            await conn.close()
+
+def create_broker(kind: str, dsn: str = None, channel: str = "forum_chat") -> Broker:
+    if kind == "postgres":
+        return PostgresBroker(dsn, channel)
+    return InMemoryBroker()
+
+class Connection:
+    """
+    一條 WebSocket 連線與它專屬的有界傳送佇列
+    """
+    def __init__(self, websocket, user, queue_size: int):
+        self.websocket = websocket
+        self.user = user
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.rooms = set()
+        self.evicted = False
+
+class ChatHub:
+    """
+    單一 worker 內的房間 fan-out
+    每則訊息只序列化一次，再放進各連線的傳送佇列；佇列滿了 (慢速的客戶端) 就直接踢掉該連線，
+    不讓一個卡住的客戶端拖慢整個房間。
+    """
+    def __init__(self, broker: Broker, queue_size: int = 64):
+        self.broker = broker
+        self.queue_size = queue_size
+        self.rooms = {}  # room -> set[Connection]
+        self.connections = 0
+        self.evictions = 0
+        self.delivered = 0
+
+    async def start(self):
+        await self.broker.start(self.dispatch)
+
+    async def close(self):
+        await self.broker.close()
+
+    def connect(self, websocket, user) -> Connection:
+        self.connections += 1
+        return Connection(websocket, user, self.queue_size)
+
+    def join(self, conn: Connection, room: str):
+        self.rooms.setdefault(room, set()).add(conn)
+        conn.rooms.add(room)
+
+    def disconnect(self, conn: Connection):
+        for room in conn.rooms:
+            members = self.rooms.get(room)
+            if members is not None:
+                members.discard(conn)
+                if not members:
+                    del self.rooms[room]
+        conn.rooms.clear()
+        self.connections -= 1
+
+    async def publish(self, room: str, message: dict):
+        await self.broker.publish(room, message)
+
+    def dispatch(self, room: str, message: dict):
+        """
+        由 Broker 呼叫：把訊息送進房間內每條連線的佇列
+        """
+        members = self.rooms.get(room)
+        if not members:
+            return
+        data = json.dumps(message, ensure_ascii=False)
+        for conn in list(members):
+            if conn.evicted:
+                continue
+            try:
+                conn.queue.put_nowait(data)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                self._evict(conn)
+
+    def notify(self, conn: Connection, message: dict):
+        """
+        只送給單一連線的訊息 (例如錯誤通知)，同樣經過傳送佇列，不與 sender 同時寫入 WebSocket
+        """
+        if conn.evicted:
+            return
+        try:
+            conn.queue.put_nowait(json.dumps(message, ensure_ascii=False))
+        except asyncio.QueueFull:
+            self._evict(conn)
+
+    def _evict(self, conn: Connection):
+        conn.evicted = True
+        self.evictions += 1
+        # 清空積壓的訊息並放入 None，讓傳送端關閉連線
+        while not conn.queue.empty():
+            conn.queue.get_nowait()
+        conn.queue.put_nowait(None)
+
+    async def sender(self, conn: Connection):
+        """
+        每條連線一個傳送 task，從佇列依序送出訊息
+        """
+        while True:
+            data = await conn.queue.get()
+            if data is None:
+                # 1013: Try Again Later，告知客戶端因為跟不上被斷線
+                await conn.websocket.close(code=1013)
+                return
+            await conn.websocket.send_text(data)
+
+    def stats(self) -> dict:
+        return {
+            "connections": self.connections,
+            "rooms": len(self.rooms),
+            "delivered": self.delivered,
+            "evictions": self.evictions
+        }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="以 InMemoryBroker 量測單一 worker 的閒置連線記憶體與廣播延遲 (不需要資料庫)")
+    parser.add_argument("--idle", type=int, default=10000, help="閒置連線數 (各自一個房間)")
+    parser.add_argument("--subscribers", type=int, default=1000, help="同一房間的訂閱者數")
+    parser.add_argument("--messages", type=int, default=200, help="廣播訊息數")
+    parser.add_argument("--rate", type=float, default=50, help="每秒廣播訊息數")
+    args = parser.parse_args()
+
+    class FakeWebSocket:
+        """
+        代替 WebSocket：記錄每則訊息從 publish 到交給 send_text 的時間
+        """
+        def __init__(self, latencies: dict):
+            self.latencies = latencies
+
+        async def send_text(self, data: str):
+            message = json.loads(data)
+            now = time.perf_counter()
+            seq = message["seq"]
+            self.latencies[seq] = max(self.latencies.get(seq, 0.0), now - message["sent_at"])
+
+        async def close(self, code: int = 1000):
+            pass
+
+    async def main():
+        hub = ChatHub(InMemoryBroker())
+        await hub.start()
+        latencies = {}  # seq -> 最後一位訂閱者收到的延遲 (整個房間的廣播延遲)
+        tasks = []
+
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        for i in range(args.idle):
+            conn = hub.connect(FakeWebSocket(latencies), None)
+            hub.join(conn, f"idle:{i}")
+            tasks.append(asyncio.create_task(hub.sender(conn)))
+        await asyncio.sleep(0)
+        idle_bytes = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+
+        for _ in range(args.subscribers):
+            conn = hub.connect(FakeWebSocket(latencies), None)
+            hub.join(conn, "bench")
+            tasks.append(asyncio.create_task(hub.sender(conn)))
+
+        start = time.perf_counter()
+        for seq in range(args.messages):
+            due = start + seq / args.rate
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            await hub.publish("bench", {"type": "message", "seq": seq, "sent_at": time.perf_counter(),
+                                        "text": "x" * 100})
+        while len(latencies) < args.messages:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.1)
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await hub.close()
+
+        ordered = sorted(latencies.values())
+        print(f"{args.idle} idle connections: {idle_bytes / 1024 / 1024:.1f} MiB "
+              f"({idle_bytes / max(args.idle, 1) / 1024:.1f} KiB per connection, hub side only)")
+        print(f"{args.messages} broadcasts to {args.subscribers} subscribers at {args.rate:g} msg/s: "
+              f"p50 {ordered[len(ordered) // 2] * 1000:.2f} ms, "
+              f"p99 {ordered[int(len(ordered) * 0.99) - 1] * 1000:.2f} ms, "
+              f"max {ordered[-1] * 1000:.2f} ms (publish → last subscriber's send_text)")
+        print(f"delivered {hub.delivered}, evictions {hub.evictions}")
+
+    asyncio.run(main())
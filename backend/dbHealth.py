@@ -0,0 +1,89 @@
+import threading
+import time
+
+class CircuitBreaker:
+    """
+    資料庫斷路器
+    連續失敗達 failure_threshold 次後進入 open 狀態，reset_timeout 秒內的請求直接回 503，
+    不再去連線池排隊等待逾時；時間到後放行一個試探請求 (half-open)，成功即恢復。
+    """
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 5.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return "open"
+            return "half-open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_timeout and not self._trial_running:
+                self._trial_running = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def release(self):
+        """
+        結果無法說明資料庫是否正常 (請求被取消、連線池排隊逾時、非連線錯誤) 時呼叫：
+        歸還 allow() 放行的試探名額，狀態不變，下一個請求可以再試探
+        """
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "rejected": self.rejected
+        }
+
+class PoolWaitStats:
+    """
+    記錄向連線池取得連線所花的時間
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.count,
+                "wait_avg_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+                "wait_max_ms": round(self.max * 1000, 3)
+            }
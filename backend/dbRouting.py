@@ -0,0 +1,142 @@
+import contextvars
+import itertools
+import threading
+import time
+from functools import wraps
+
+from sqlalchemy.orm import Session
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+
+from dbHealth import CircuitBreaker
+
+# 讀寫分離：標記為 @read_only 的查詢函式在「偏好副本」的 Session 中改由副本 (replica) 執行，
+# 其餘 (寫入) 一律走主庫。剛寫入過的客戶端在 pin 期間內的讀取也走主庫 (read-your-own-writes)。
+PIN_COOKIE = "db_pin"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# 目前請求是否必須讀主庫 (由 ReadYourWritesMiddleware 依 cookie 設定)
+primary_pinned = contextvars.ContextVar("primary_pinned", default=False)
+
+def read_only(func):
+    """
+    標記只讀的查詢函式：執行期間 Session 內的語句可以由副本處理
+    """
+    @wraps(func)
+    def wrapper(db, *args, **kwargs):
+        previous = db.info.get("reading", False)
+        db.info["reading"] = True
+        try:
+            return func(db, *args, **kwargs)
+        finally:
+            db.info["reading"] = previous
+    wrapper.read_only = True
+    return wrapper
+
+class Replica:
+    def __init__(self, name: str, engine, breaker: CircuitBreaker):
+        self.name = name
+        self.engine = engine
+        self.breaker = breaker
+        self.sessions = 0
+        self.queries = 0
+
+class ReplicaSet:
+    """
+    副本清單：依序輪流 (round-robin) 分配，每個副本有自己的斷路器，
+    連線失敗達門檻即暫時剔除，reset_timeout 後放行一個試探請求，成功才重新加入
+    """
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.replicas = []
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+        self.fallbacks = 0
+
+    def add(self, name: str, engine) -> Replica:
+        replica = Replica(name, engine, CircuitBreaker(self.failure_threshold, self.reset_timeout))
+        self.replicas.append(replica)
+        return replica
+
+    def clear(self):
+        self.replicas = []
+
+    def choose(self):
+        """
+        回傳下一個可用的副本；沒有設定副本或全部被剔除時回傳 None (改走主庫)
+        """
+        count = len(self.replicas)
+        if not count:
+            return None
+        with self._lock:
+            start = next(self._next)
+        for offset in range(count):
+            replica = self.replicas[(start + offset) % count]
+            if replica.breaker.allow():
+                replica.sessions += 1
+                return replica
+        self.fallbacks += 1
+        return None
+
+    def stats(self) -> dict:
+        replicas = []
+        for replica in self.replicas:
+            pool = replica.engine.sync_engine.pool
+            replicas.append({
+                "name": replica.name,
+                "sessions": replica.sessions,
+                "queries": replica.queries,
+                "checked_out": pool.checkedout(),
+                "breaker": replica.breaker.stats()
+            })
+        return {"replicas": replicas, "fallbacks_to_primary": self.fallbacks}
+
+class RoutingSession(Session):
+    """
+    AsyncSession 底下實際執行 SQL 的同步 Session
+    info["replica"] 有值時 (open_async_db(read_only=True) 選定的副本)，
+    取連線 (沒有語句) 與 @read_only 函式中的語句都交給該副本，其他語句走主庫 (Session 的 bind)
+    """
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        replica = self.info.get("replica")
+        if replica is not None and (clause is None or self.info.get("reading")):
+            if clause is not None:
+                replica.queries += 1
+            return replica.engine.sync_engine
+        return super().get_bind(mapper, clause=clause, **kwargs)
+
+class ReadYourWritesMiddleware:
+    """
+    ASGI middleware：寫入請求 (非 GET/HEAD/OPTIONS) 成功後設定 db_pin cookie，
+    pin_sec 秒內同一個客戶端的讀取都走主庫，避免因副本延遲讀不到自己剛寫入的資料
+    """
+    def __init__(self, app, pin_sec: float = 5.0):
+        self.app = app
+        self.pin_sec = pin_sec
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            pinned_until = float(HTTPConnection(scope).cookies.get(PIN_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0.0
+        token = primary_pinned.set(pinned_until > time.time())
+        writing = scope["method"] not in SAFE_METHODS
+
+        async def send_wrapper(message):
+            if writing and message["type"] == "http.response.start" and message["status"] < 400:
+                until = int(time.time() + self.pin_sec) + 1
+                MutableHeaders(scope=message).append(
+                    "set-cookie",
+                    f"{PIN_COOKIE}={until}; Max-Age={int(self.pin_sec) + 1}; Path=/; HttpOnly; SameSite=Lax"
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            primary_pinned.reset(token)
@@ -1,18 +1,24 @@
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from collections import deque
+import heapq
+import itertools
 import os
+import threading
+import time
 
+from metrics import MAIL_QUEUE_LATENCY, registry
 
-# 建議將這些設定放入環境變數 (.env)
-SMTP_SERVER = "smtp.gmail.com" # 或你的郵件伺服器
-SMTP_PORT = 587
-SENDER_EMAIL = "C113118207@nkust.edu.tw"
-SENDER_PASSWORD = "qlfk enex ozsx gnot" # 注意：Google 需要去設定申請「應用程式密碼」
+# 郵件設定由環境變數提供 (未設定時使用開發用預設值)
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com") # 或你的郵件伺服器
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SENDER_EMAIL = os.getenv("SENDER_EMAIL", "C113118207@nkust.edu.tw")
+SENDER_PASSWORD = os.getenv("SENDER_PASSWORD", "qlfk enex ozsx gnot") # 注意：Google 需要去設定申請「應用程式密碼」
 
-def send_verification_email(to_email: str, code: str):
+def build_verification_message(to_email: str, code: str) -> MIMEMultipart:
     """
-    發送驗證碼郵件的同步函式
+    建立驗證碼郵件內容
     """
     subject = "【Chat Forum】您的註冊驗證碼"
     body = f"""
@@ -46,6 +52,13 @@ def send_verification_email(to_email: str, code: str):
     msg['To'] = to_email
     msg['Subject'] = subject
     msg.attach(MIMEText(body, 'html'))
+    return msg
+
+def send_verification_email(to_email: str, code: str):
+    """
+    發送驗證碼郵件的同步函式 (單次連線，供指令列或測試使用；API 請改用 mail_queue)
+    """
+    msg = build_verification_message(to_email, code)
 
     try:
         server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
@@ -58,4 +71,249 @@ def send_verification_email(to_email: str, code: str):
         return {"status": "success", "message": "Email sent!"}
     except Exception as e:
         print(f"Email sending failed: {e}")
-        return {"status": "error", "message": str(e)}
\ No newline at end of file
+        return {"status": "error", "message": str(e)}
+
+class MailQueueFull(Exception):
+    """
+    寄信佇列已滿，呼叫端應回 503 請使用者稍後再試
+    """
+
+class SMTPConnectionPool:
+    """
+    可重複使用、已完成 STARTTLS 與登入的 SMTP 連線池
+    閒置超過 idle_check_sec 的連線在使用前先送 NOOP 確認仍然有效
+    """
+    def __init__(self, size: int = 2, idle_check_sec: float = 30.0, timeout: float = 30.0):
+        self.size = size
+        self.idle_check_sec = idle_check_sec
+        self.timeout = timeout
+        self._idle = []  # [(最後使用時間, smtplib.SMTP)]
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self.connects = 0
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=self.timeout)
+        server.starttls()
+        server.login(SENDER_EMAIL, SENDER_PASSWORD)
+        self.connects += 1
+        return server
+
+    def acquire(self) -> smtplib.SMTP:
+        self._slots.acquire()
+        try:
+            while True:
+                with self._lock:
+                    last_used, server = self._idle.pop() if self._idle else (None, None)
+                if server is None:
+                    return self._connect()
+                if time.monotonic() - last_used < self.idle_check_sec:
+                    return server
+                try:
+                    if server.noop()[0] == 250:
+                        return server
+                except OSError:
+                    # 包含 SMTPException 與 socket 錯誤，都代表這條閒置連線不能用了
+                    pass
+                self._close(server)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, server: smtplib.SMTP, broken: bool = False):
+        if broken:
+            self._close(server)
+        else:
+            with self._lock:
+                self._idle.append((time.monotonic(), server))
+        self._slots.release()
+
+    def _close(self, server: smtplib.SMTP):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for _, server in idle:
+            self._close(server)
+
+class OutboundMail:
+    def __init__(self, to_email: str, message: MIMEMultipart):
+        self.to_email = to_email
+        self.message = message
+        self.attempts = 0
+        self.enqueued_at = time.monotonic()
+        self.last_error = None
+
+class MailQueue:
+    """
+    背景寄信佇列
+    - 工作執行緒一次取出最多 batch_size 封信，用同一條連線池中的連線寄出
+    - 以 rate_per_sec 限制整體寄送速度 (避免觸發郵件服務商的限流)
+    - 失敗時以指數退避重試，超過 max_attempts 次移入 dead letter 清單
+    """
+    def __init__(self, pool: SMTPConnectionPool, maxsize: int = 1000, batch_size: int = 20,
+                 rate_per_sec: float = 5.0, max_attempts: int = 5,
+                 backoff_base: float = 2.0, backoff_max: float = 300.0, dead_letter_size: int = 500):
+        self.pool = pool
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.rate_per_sec = rate_per_sec
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.dead_letters = deque(maxlen=dead_letter_size)
+
+        self._heap = []  # [(可寄送時間, 序號, OutboundMail)]
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._workers = []
+        self._running = False
+        # token bucket
+        self._tokens = rate_per_sec
+        self._refilled_at = time.monotonic()
+
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def enqueue(self, to_email: str, code: str):
+        self.put(OutboundMail(to_email, build_verification_message(to_email, code)))
+
+    def put(self, mail: OutboundMail, delay: float = 0.0):
+        with self._cond:
+            if mail.attempts == 0 and len(self._heap) >= self.maxsize:
+                raise MailQueueFull()
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), mail))
+            self._cond.notify()
+
+    def start(self, workers: int = 1):
+        self._running = True
+        for i in range(workers):
+            thread = threading.Thread(target=self._run, name=f"mail-worker-{i}", daemon=True)
+            thread.start()
+            self._workers.append(thread)
+
+    def stop(self, timeout: float = 10.0):
+        """
+        停止接收新工作，等待目前已到期的信寄完 (最多 timeout 秒)
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self._workers:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._workers.clear()
+        self.pool.close()
+
+    def _take_batch(self) -> list:
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self._heap and self._heap[0][0] <= now:
+                    break
+                if not self._running:
+                    return []
+                wait = self._heap[0][0] - now if self._heap else None
+                self._cond.wait(wait)
+            batch = []
+            while self._heap and self._heap[0][0] <= now and len(batch) < self.batch_size:
+                batch.append(heapq.heappop(self._heap)[2])
+            return batch
+
+    def _wait_for_token(self):
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                self._tokens = min(self.rate_per_sec, self._tokens + (now - self._refilled_at) * self.rate_per_sec)
+                self._refilled_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate_per_sec
+            time.sleep(wait)
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            self._send_batch(batch)
+
+    def _send_batch(self, batch: list):
+        try:
+            server = self.pool.acquire()
+        except Exception as e:
+            for mail in batch:
+                self._retry_or_dead_letter(mail, e)
+            return
+
+        broken = False
+        for index, mail in enumerate(batch):
+            self._wait_for_token()
+            try:
+                server.send_message(mail.message)
+            except smtplib.SMTPServerDisconnected as e:
+                # 連線斷了：這封與剩下的信都重新排程
+                broken = True
+                for pending in batch[index:]:
+                    self._retry_or_dead_letter(pending, e)
+                break
+            except smtplib.SMTPException as e:
+                # 單封信被拒 (例如 SMTPRecipientsRefused)：smtplib 已送出 RSET，連線可以繼續寄下一封
+                # 注意 SMTPException 是 OSError 的子類別，必須在 OSError 之前處理
+                self._retry_or_dead_letter(mail, e)
+                continue
+            except OSError as e:
+                # socket 層級的錯誤 (逾時、連線被重置)
+                broken = True
+                for pending in batch[index:]:
+                    self._retry_or_dead_letter(pending, e)
+                break
+            latency = time.monotonic() - mail.enqueued_at
+            MAIL_QUEUE_LATENCY.observe(latency)
+            with self._cond:
+                self.sent += 1
+                self.latency_total += latency
+                self.latency_max = max(self.latency_max, latency)
+        self.pool.release(server, broken=broken)
+
+    def _retry_or_dead_letter(self, mail: OutboundMail, error: Exception):
+        mail.attempts += 1
+        mail.last_error = str(error)
+        if mail.attempts >= self.max_attempts:
+            with self._cond:
+                self.failed += 1
+                self.dead_letters.append({"to": mail.to_email, "attempts": mail.attempts, "error": mail.last_error})
+            print(f"Email sending failed permanently: {mail.to_email} ({error})")
+            return
+        with self._cond:
+            self.retried += 1
+        self.put(mail, delay=min(self.backoff_max, self.backoff_base ** mail.attempts))
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "depth": len(self._heap),
+                "sent": self.sent,
+                "retried": self.retried,
+                "failed": self.failed,
+                "dead_letters": len(self.dead_letters),
+                "latency_avg_ms": round(self.latency_total / self.sent * 1000, 1) if self.sent else 0.0,
+                "latency_max_ms": round(self.latency_max * 1000, 1),
+                "smtp_connects": self.pool.connects
+            }
+
+mail_queue = MailQueue(
+    SMTPConnectionPool(size=int(os.getenv("SMTP_POOL_SIZE", "2"))),
+    rate_per_sec=float(os.getenv("MAIL_RATE_PER_SEC", "5"))
+)
+
+registry.gauge("mail_queue_depth", "Messages waiting in the outbound mail queue",
+               callback=lambda: mail_queue.stats()["depth"])
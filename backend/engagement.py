@@ -0,0 +1,146 @@
+import argparse
+import asyncio
+import random
+import time
+from collections import defaultdict
+
+import databaseOperate
+from metrics import registry
+
+VIEWS_RECORDED = registry.counter("post_views_recorded_total", "Post views counted in memory")
+VIEW_FLUSHES = registry.counter("post_view_flushes_total", "Batched view-count writes to the database")
+
+class ViewCounter:
+    """
+    文章瀏覽數的 write-behind 計數器：每次瀏覽只在記憶體累加，
+    每 interval_sec 秒 (或累積的文章數超過 max_pending 時) 以一個 UPDATE 批次寫回並重算 hot_score
+    寫入失敗時把差額併回去，下一輪再試；關閉時會做最後一次寫回
+    """
+    def __init__(self, interval_sec: float = 5, max_pending: int = 10000, flush=None):
+        self.interval_sec = interval_sec
+        self.max_pending = max_pending
+        self._flush_func = flush or self._flush_db
+        self._pending = defaultdict(int)  # post_id -> 尚未寫回的瀏覽數
+        self._task = None
+        # Event 綁定建立時的事件迴圈，所以在 start() 中才建立
+        self._wakeup = None
+        self.recorded = 0
+        self.flushed_views = 0
+        self.flushes = 0
+        self.failures = 0
+        self.last_flush = None
+
+    def record(self, post_id: int, count: int = 1):
+        self._pending[post_id] += count
+        self.recorded += count
+        VIEWS_RECORDED.inc(count)
+        if len(self._pending) >= self.max_pending and self._wakeup is not None:
+            self._wakeup.set()
+
+    @staticmethod
+    async def _flush_db(post_ids: list, deltas: list) -> int:
+        async with databaseOperate.open_async_db() as db:
+            return await db.run_sync(databaseOperate.flush_view_counts, post_ids, deltas)
+
+    async def flush(self) -> int:
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, defaultdict(int)
+        post_ids = sorted(pending)
+        deltas = [pending[post_id] for post_id in post_ids]
+        try:
+            updated = await self._flush_func(post_ids, deltas)
+        except Exception:
+            self.failures += 1
+            for post_id, delta in pending.items():
+                self._pending[post_id] += delta
+            raise
+        views = sum(deltas)
+        self.flushes += 1
+        self.flushed_views += views
+        self.last_flush = {"posts": len(post_ids), "views": views, "updated": updated}
+        VIEW_FLUSHES.inc()
+        return updated
+
+    async def _loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval_sec)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"View count flush failed: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"Final view count flush failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "interval_sec": self.interval_sec,
+            "pending_posts": len(self._pending),
+            "pending_views": sum(self._pending.values()),
+            "recorded": self.recorded,
+            "flushed_views": self.flushed_views,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "last_flush": self.last_flush
+        }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="模擬大量瀏覽，量測寫回資料庫的語句數 (不連資料庫)")
+    parser.add_argument("--rate", type=int, default=5000, help="每秒瀏覽數")
+    parser.add_argument("--seconds", type=float, default=10, help="模擬秒數")
+    parser.add_argument("--posts", type=int, default=20000, help="文章數 (瀏覽集中在少數熱門文章)")
+    parser.add_argument("--interval", type=float, default=1, help="寫回間隔 (秒)")
+    args = parser.parse_args()
+
+    writes = []
+
+    async def fake_flush(post_ids, deltas):
+        writes.append(len(post_ids))
+        return len(post_ids)
+
+    async def main():
+        counter = ViewCounter(interval_sec=args.interval, flush=fake_flush)
+        counter.start()
+        # 依 Zipf 分布挑文章：少數熱門文章佔大部分瀏覽
+        weights = [1 / (rank + 1) for rank in range(args.posts)]
+        start = time.perf_counter()
+        record_time = 0.0
+        while time.perf_counter() - start < args.seconds:
+            # 依經過時間補足應有的瀏覽數，不受 sleep 精度影響
+            due = int(args.rate * (time.perf_counter() - start)) - counter.recorded
+            batch = random.choices(range(1, args.posts + 1), weights=weights, k=max(due, 0))
+            t0 = time.perf_counter()
+            for post_id in batch:
+                counter.record(post_id)
+            record_time += time.perf_counter() - t0
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        await counter.stop()
+        print(f"{counter.recorded} views in {elapsed:.1f}s ({counter.recorded / elapsed:.0f} views/sec)")
+        print(f"{len(writes)} UPDATE statements ({len(writes) / elapsed:.1f} writes/sec), "
+              f"{sum(writes)} rows, avg {sum(writes) / max(len(writes), 1):.0f} rows per statement")
+        print(f"record() cost {record_time / max(counter.recorded, 1) * 1e6:.2f} µs per view")
+
+    asyncio.run(main())
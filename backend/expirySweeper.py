@@ -0,0 +1,73 @@
+import asyncio
+
+import databaseOperate
+from metrics import registry
+
+EXPIRED_ROWS = registry.counter("expired_rows_deleted_total", "Rows removed by the expiry sweeper", ("table",))
+
+class ExpirySweeper:
+    """
+    定期清除過期的 user_sessions 與 email_verifications
+    每批刪除 batch_size 筆並立即 commit，避免長時間持有鎖；單次最多 max_batches 批，剩下的留給下一輪
+    """
+    def __init__(self, interval_sec: float = 300, batch_size: int = 1000, max_batches: int = 50):
+        self.interval_sec = interval_sec
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self._task = None
+        self.runs = 0
+        self.last_run = None
+
+    async def _sweep(self, func, *args) -> int:
+        total = 0
+        for _ in range(self.max_batches):
+            async with databaseOperate.open_async_db() as db:
+                deleted = await db.run_sync(func, *args, self.batch_size)
+            total += deleted
+            if deleted < self.batch_size:
+                break
+            # 批次之間讓出事件迴圈
+            await asyncio.sleep(0)
+        return total
+
+    async def run_once(self) -> dict:
+        sessions = await self._sweep(databaseOperate.delete_expired_sessions, databaseOperate.SESSION_EXPIRE_SEC)
+        codes = await self._sweep(databaseOperate.delete_expired_verification_codes)
+        EXPIRED_ROWS.inc(sessions, "user_sessions")
+        EXPIRED_ROWS.inc(codes, "email_verifications")
+        self.runs += 1
+        self.last_run = {"user_sessions": sessions, "email_verifications": codes}
+        if sessions or codes:
+            print(f"Expiry sweep reclaimed {sessions} sessions, {codes} verification codes")
+        return self.last_run
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Expiry sweep failed: {e}")
+            await asyncio.sleep(self.interval_sec)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "interval_sec": self.interval_sec,
+            "batch_size": self.batch_size,
+            "runs": self.runs,
+            "last_run": self.last_run
+        }
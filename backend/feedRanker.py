@@ -0,0 +1,236 @@
+import argparse
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics import FEED_SCORE_LATENCY
+
+# 個人化動態牆：取最近 FEED_WINDOW_SIZE 篇文章當候選，依使用者的 topic_weights
+# (標籤 / 看板偏好) 與時間衰減一次算完分數再排序，不必對每篇文章各自查詢
+FEED_WINDOW_SIZE = int(os.getenv("FEED_WINDOW_SIZE", "5000"))
+FEED_WINDOW_TTL_SEC = int(os.getenv("FEED_WINDOW_TTL_SEC", "30"))
+FEED_WEIGHTS_TTL_SEC = int(os.getenv("FEED_WEIGHTS_TTL_SEC", "300"))
+FEED_HALF_LIFE_HOURS = float(os.getenv("FEED_HALF_LIFE_HOURS", "24"))
+
+def parse_weights(raw) -> tuple:
+    """
+    解析 user_profiles.topic_weights，回傳 (標籤權重, 看板權重)
+    支援 {"tags": {...}, "boards": {...}}，或直接以標籤為 key 的扁平格式
+    """
+    if not isinstance(raw, dict):
+        return {}, {}
+    if "tags" in raw or "boards" in raw:
+        raw_tags = raw.get("tags") or {}
+        raw_boards = raw.get("boards") or {}
+    else:
+        raw_tags, raw_boards = raw, {}
+
+    tags = {str(k): float(v) for k, v in raw_tags.items() if isinstance(v, (int, float))}
+    boards = {}
+    for k, v in raw_boards.items():
+        try:
+            boards[int(k)] = float(v)
+        except (TypeError, ValueError):
+            continue
+    return tags, boards
+
+class CandidateWindow:
+    """
+    最近一批文章 (created_at DESC) 的快照，欄位攤平成 NumPy 陣列：
+    - board_idx：每篇文章的看板在 board_vocab 中的位置
+    - tag_rows / tag_cols：(文章位置, 標籤在 tag_vocab 中的位置) 的稀疏表示
+    """
+    __slots__ = ("version", "posts", "ids", "created", "board_vocab", "board_idx",
+                 "tag_vocab", "tag_rows", "tag_cols")
+
+    def __init__(self, posts: list, version: int = 0):
+        self.version = version
+        self.posts = posts
+        n = len(posts)
+        self.ids = np.fromiter((p.id for p in posts), dtype=np.int64, count=n)
+        self.created = np.fromiter((p.created_at.timestamp() for p in posts), dtype=np.float64, count=n)
+        self.board_vocab = {}
+        self.board_idx = np.empty(n, dtype=np.int32)
+        self.tag_vocab = {}
+        tag_rows = []
+        tag_cols = []
+        for i, post in enumerate(posts):
+            self.board_idx[i] = self.board_vocab.setdefault(post.board_id, len(self.board_vocab))
+            for tag in post.tags or ():
+                tag_rows.append(i)
+                tag_cols.append(self.tag_vocab.setdefault(tag, len(self.tag_vocab)))
+        self.tag_rows = np.asarray(tag_rows, dtype=np.int32)
+        self.tag_cols = np.asarray(tag_cols, dtype=np.int32)
+
+    def vectorize(self, tags: dict, boards: dict) -> tuple:
+        """
+        把使用者權重對應到本快照的 vocab，回傳 (tag_w, board_w) 陣列
+        """
+        tag_w = np.zeros(len(self.tag_vocab), dtype=np.float64)
+        for tag, weight in tags.items():
+            pos = self.tag_vocab.get(tag)
+            if pos is not None:
+                tag_w[pos] = weight
+        board_w = np.zeros(len(self.board_vocab), dtype=np.float64)
+        for board_id, weight in boards.items():
+            pos = self.board_vocab.get(board_id)
+            if pos is not None:
+                board_w[pos] = weight
+        return tag_w, board_w
+
+    def score(self, tag_w, board_w, ref_time: float, half_life_hours: float = FEED_HALF_LIFE_HOURS):
+        """
+        分數 = max(1 + 看板權重 + 標籤權重總和, 0) × 0.5^(文章年齡 / 半衰期)
+        沒有任何偏好時退化成單純依時間排序
+        """
+        affinity = board_w[self.board_idx]
+        if self.tag_rows.size:
+            affinity = affinity + np.bincount(self.tag_rows, weights=tag_w[self.tag_cols],
+                                              minlength=len(self.posts))
+        decay = np.exp2((self.created - ref_time) / (half_life_hours * 3600.0))
+        return np.maximum(1.0 + affinity, 0.0) * decay
+
+    def page(self, scores, limit: int, after: tuple = None) -> list:
+        """
+        依 (分數, id) 由大到小取一頁，after 為上一頁最後一筆的 (分數, id)
+        回傳 [(文章, 分數), ...]
+        """
+        if after is not None:
+            after_score, after_id = after
+            candidates = np.flatnonzero((scores < after_score) | ((scores == after_score) & (self.ids < after_id)))
+        else:
+            candidates = np.arange(len(self.posts))
+        order = candidates[np.lexsort((-self.ids[candidates], -scores[candidates]))][:limit]
+        return [(self.posts[i], float(scores[i])) for i in order]
+
+class FeedRanker:
+    """
+    候選文章快照 (全站共用，每 window_ttl 秒重新載入) 與每位使用者的權重向量快取
+    權重向量綁定快照版本，快照更新後依快取的原始權重重新對應，不必再查資料庫
+    """
+    def __init__(self, window_size: int = FEED_WINDOW_SIZE, window_ttl: float = FEED_WINDOW_TTL_SEC,
+                 weights_ttl: float = FEED_WEIGHTS_TTL_SEC, half_life_hours: float = FEED_HALF_LIFE_HOURS,
+                 maxsize: int = 10000):
+        self.window_size = window_size
+        self.window_ttl = window_ttl
+        self.weights_ttl = weights_ttl
+        self.half_life_hours = half_life_hours
+        self.maxsize = maxsize
+        self._window = None
+        self._window_expires = 0.0
+        self._window_lock = asyncio.Lock()
+        # user_id -> [過期時間 monotonic, (標籤權重, 看板權重), 快照版本, tag_w, board_w]
+        self._weights = OrderedDict()
+        self.window_loads = 0
+        self.weight_hits = 0
+        self.weight_misses = 0
+
+    async def get_window(self, load) -> CandidateWindow:
+        """
+        取得候選快照；過期時由一個請求呼叫 load(window_size) 重新載入，其餘請求等待同一次結果
+        """
+        if self._window is not None and self._window_expires > time.monotonic():
+            return self._window
+        async with self._window_lock:
+            if self._window is not None and self._window_expires > time.monotonic():
+                return self._window
+            posts = await load(self.window_size)
+            version = self._window.version + 1 if self._window is not None else 1
+            self._window = CandidateWindow(posts, version)
+            self._window_expires = time.monotonic() + self.window_ttl
+            self.window_loads += 1
+            return self._window
+
+    async def get_vectors(self, user_id, window: CandidateWindow, load) -> tuple:
+        """
+        取得使用者在此快照上的 (tag_w, board_w)；原始權重過期時才呼叫 load() 讀取 topic_weights
+        """
+        key = str(user_id)
+        now = time.monotonic()
+        entry = self._weights.get(key)
+        if entry is None or entry[0] <= now:
+            self.weight_misses += 1
+            entry = [now + self.weights_ttl, parse_weights(await load()), None, None, None]
+            self._weights[key] = entry
+            while len(self._weights) > self.maxsize:
+                self._weights.popitem(last=False)
+        else:
+            self.weight_hits += 1
+        self._weights.move_to_end(key)
+        if entry[2] != window.version:
+            entry[3], entry[4] = window.vectorize(*entry[1])
+            entry[2] = window.version
+        return entry[3], entry[4]
+
+    def invalidate_user(self, user_id):
+        self._weights.pop(str(user_id), None)
+
+    def rank(self, window: CandidateWindow, tag_w, board_w, limit: int, ref_time: float = None, after: tuple = None):
+        """
+        計分並取一頁，回傳 ([(文章, 分數), ...], ref_time)
+        衰減以 ref_time 為基準：第一頁取快照當下時間，之後的頁面沿用游標內的值，分數才會前後一致
+        """
+        if ref_time is None:
+            ref_time = time.time()
+        start = time.perf_counter()
+        scores = window.score(tag_w, board_w, ref_time, self.half_life_hours)
+        page = window.page(scores, limit, after)
+        FEED_SCORE_LATENCY.observe(time.perf_counter() - start)
+        return page, ref_time
+
+    def stats(self) -> dict:
+        return {
+            "window_posts": len(self._window.posts) if self._window is not None else 0,
+            "window_version": self._window.version if self._window is not None else 0,
+            "window_loads": self.window_loads,
+            "cached_users": len(self._weights),
+            "weight_hits": self.weight_hits,
+            "weight_misses": self.weight_misses
+        }
+
+if __name__ == "__main__":
+    from datetime import datetime, timedelta, timezone
+    from types import SimpleNamespace
+
+    parser = argparse.ArgumentParser(description="以隨機產生的候選文章量測個人化動態牆的計分時間")
+    parser.add_argument("--candidates", type=int, default=FEED_WINDOW_SIZE, help="候選文章數")
+    parser.add_argument("--tags", type=int, default=500, help="標籤種類數")
+    parser.add_argument("--boards", type=int, default=20, help="看板數")
+    parser.add_argument("--rounds", type=int, default=200, help="量測次數")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    now = datetime.now(timezone.utc)
+    tag_names = [f"tag{i}" for i in range(args.tags)]
+    posts = [
+        SimpleNamespace(
+            id=args.candidates - i,
+            created_at=now - timedelta(seconds=float(rng.uniform(0, 7 * 86400))),
+            board_id=int(rng.integers(args.boards)),
+            tags=list(rng.choice(tag_names, size=int(rng.integers(0, 6)), replace=False))
+        )
+        for i in range(args.candidates)
+    ]
+    window = CandidateWindow(posts, version=1)
+    weights = parse_weights({
+        "tags": {name: float(rng.normal()) for name in rng.choice(tag_names, size=50, replace=False)},
+        "boards": {str(b): float(rng.normal()) for b in range(args.boards)}
+    })
+    tag_w, board_w = window.vectorize(*weights)
+    ranker = FeedRanker()
+
+    timings = []
+    after = None
+    for _ in range(args.rounds):
+        start = time.perf_counter()
+        page, ref_time = ranker.rank(window, tag_w, board_w, 20, now.timestamp(), after)
+        timings.append(time.perf_counter() - start)
+        after = (page[-1][1], page[-1][0].id) if len(page) == 20 else None
+    timings.sort()
+    print(f"{args.candidates} candidates, {len(window.tag_rows)} tag links, {args.rounds} rounds")
+    print(f"p50 {timings[len(timings) // 2] * 1000:.3f} ms, "
+          f"p99 {timings[int(len(timings) * 0.99) - 1] * 1000:.3f} ms, "
+          f"max {timings[-1] * 1000:.3f} ms")
@@ -1,26 +1,143 @@
 import os
+import asyncio
 import random
-from fastapi import FastAPI, Request, Cookie, HTTPException, Depends, Response, BackgroundTasks
+from fastapi import FastAPI, Request, Cookie, HTTPException, Depends, Query, Response, BackgroundTasks, WebSocket, WebSocketDisconnect
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
-from fastapi.responses import FileResponse, HTMLResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import httpx
 import time
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
 import secrets
+import tempfile
 import json
 from typing import List, Optional
 
 import databaseOperate
 import emailSender
 import password
+import responseCache
+import postModels
+import metrics
+import rateLimiter
+import expirySweeper
+import staticAssets
+import chatHub
+import postFeed
+import feedRanker
+import bulkPosts
+import engagement
+import dbRouting
+import sessionCache
+
+SESSION_EXPIRE_SEC = databaseOperate.SESSION_EXPIRE_SEC
+# 登入回應的最短時間 (防止以回應時間判斷帳號是否存在)，成功與失敗都補足到這個長度
+LOGIN_MIN_DURATION_SEC = 0.5
+# 文章 API 回應快取的存活時間 (秒)；發文、留言時列表快取會立即失效 (透過 broker 通知所有 worker)
+POSTS_CACHE_TTL_SEC = 5
+POST_CACHE_TTL_SEC = 60
+COUNTS_CACHE_TTL_SEC = 60
+
+response_cache = responseCache.ResponseCache()
+
+# 管理員匯入文章的上傳大小上限，以及累積多少資料才交給執行緒寫入暫存檔
+IMPORT_MAX_UPLOAD_BYTES = int(os.getenv("IMPORT_MAX_UPLOAD_BYTES", str(512 * 1024 * 1024)))
+IMPORT_WRITE_BUFFER_BYTES = 1024 * 1024
+
+# 登入與驗證碼相關 API 的限流規則 (RATE_LIMIT_BACKEND=redis 時多個 worker 共用計數)
+RATE_RULES = {
+    "login_ip": rateLimiter.Rule("login_ip", 30, 60),
+    # 只計算密碼錯誤的次數，並以 (帳號, IP) 為 key：成功登入不會用掉額度，別人也無法從其他 IP 鎖住已知帳號
+    "login_user": rateLimiter.Rule("login_user", 10, 300),
+    "send_code_ip": rateLimiter.Rule("send_code_ip", 10, 600),
+    "send_code_email": rateLimiter.Rule("send_code_email", 3, 600),
+    "check_code_ip": rateLimiter.Rule("check_code_ip", 30, 600),
+    "check_code_email": rateLimiter.Rule("check_code_email", 10, 600),
+    # 每條聊天室 WebSocket 連線各自計數
+    "chat_message": rateLimiter.Rule("chat_message", 20, 10),
+}
+rate_limiter = rateLimiter.RateLimiter(
+    rateLimiter.create_backend(os.getenv("RATE_LIMIT_BACKEND", "memory"), os.getenv("REDIS_URL"))
+)
 
-SESSION_EXPIRE_SEC = 86400
+def limit_by_ip(rule_name: str):
+    """
+    以來源 IP 限流的依賴；請放在 db 參數之前，被擋下的請求連資料庫連線都不會取用
+    """
+    async def dependency(request: Request):
+        await rate_limiter.check(RATE_RULES[rule_name], rateLimiter.client_ip(request))
+    return dependency
+
+# 即時聊天與新文章推播：CHAT_BROKER=postgres 時透過 LISTEN/NOTIFY 讓多個 worker 共用
+BROKER_KIND = os.getenv("CHAT_BROKER", "memory")
+CHAT_MAX_MESSAGE_LEN = 2000
+chat_hub = chatHub.ChatHub(
+    chatHub.create_broker(BROKER_KIND, databaseOperate.LISTEN_DSN, "forum_chat"),
+    queue_size=int(os.getenv("CHAT_SEND_QUEUE_SIZE", "64"))
+)
+# SSE 心跳間隔 (秒)，避免代理伺服器切斷閒置連線
+FEED_KEEPALIVE_SEC = 15
+post_feed = postFeed.PostFeed(
+    chatHub.create_broker(BROKER_KIND, databaseOperate.LISTEN_DSN, "forum_posts"),
+    ring_size=int(os.getenv("FEED_REPLAY_SIZE", "512"))
+)
 
-app = FastAPI()
+# Session 快取失效 (登出、重新登入) 透過同一種 broker 廣播，其他 worker 的快取也立即清除
+session_revocations = sessionCache.RevocationBroadcaster(
+    databaseOperate.session_cache,
+    chatHub.create_broker(BROKER_KIND, databaseOperate.LISTEN_DSN, "forum_sessions")
+)
+# 回應快取的失效 (發文、留言、匯入) 也廣播給其他 worker，多 worker 時列表與 comment_count 不會舊到 TTL 結束
+cache_invalidations = responseCache.InvalidationBroadcaster(
+    response_cache,
+    chatHub.create_broker(BROKER_KIND, databaseOperate.LISTEN_DSN, "forum_cache")
+)
+
+# 文章瀏覽數：記憶體累加，定期批次寫回並更新 hot_score
+view_counter = engagement.ViewCounter(interval_sec=float(os.getenv("VIEW_FLUSH_INTERVAL_SEC", "5")))
+
+# 個人化動態牆：候選文章快照與使用者權重向量的快取
+feed_ranker = feedRanker.FeedRanker()
+
+# 假設你的 dist 資料夾路徑 (Vite 打包結果)，啟動時建立檔案索引
+DIST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dist") 
+static_site = staticAssets.StaticSite(DIST_DIR)
+
+# 過期 Session 與驗證碼的背景清除
+sweeper = expirySweeper.ExpirySweeper(
+    interval_sec=float(os.getenv("SWEEP_INTERVAL_SEC", "300")),
+    batch_size=int(os.getenv("SWEEP_BATCH_SIZE", "1000"))
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 每個 worker 啟動後才建立連線池、背景工作與外部連線，收到 SIGTERM 時依相反順序收尾
+    databaseOperate.init_engines()
+    password.PasswordManager.start()
+    static_site.load()
+    await chat_hub.start()
+    await post_feed.start()
+    await session_revocations.start()
+    await cache_invalidations.start()
+    emailSender.mail_queue.start(workers=int(os.getenv("MAIL_WORKERS", "2")))
+    sweeper.start()
+    view_counter.start()
+    yield
+    await view_counter.stop()
+    await sweeper.stop()
+    await asyncio.to_thread(emailSender.mail_queue.stop)
+    await cache_invalidations.close()
+    await session_revocations.close()
+    await post_feed.close()
+    await chat_hub.close()
+    await asyncio.to_thread(password.PasswordManager.shutdown)
+    await databaseOperate.dispose_engines()
+
+app = FastAPI(lifespan=lifespan)
 
 class LoginRequest(BaseModel):
     name: str 
@@ -45,26 +162,86 @@ class PostCreateRequest(BaseModel):
     board_id: int
     tags: List[str] = []
 
+class CommentCreateRequest(BaseModel):
+    content: str
+    parent_id: Optional[int] = None
+
+app.add_middleware(metrics.MetricsMiddleware)
+
+# 有設定唯讀副本時，寫入後的短時間內讓同一個客戶端的讀取走主庫 (read-your-own-writes)
+if databaseOperate.REPLICA_DATABASE_URLS:
+    app.add_middleware(dbRouting.ReadYourWritesMiddleware, pin_sec=float(os.getenv("DB_PIN_PRIMARY_SEC", "5")))
+
+# 前端的來源；WebSocket 不受 CORS 限制，聊天室也以這份清單檢查 Origin
+ALLOWED_ORIGINS = ["http://127.0.0.1:5173", "http://localhost:5173"]
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["http://127.0.0.1:5173", "http://localhost:5173"],
+    allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
+def json_response(payload, **kwargs) -> Response:
+    # 文章相關回應直接以 orjson 序列化，不經過 jsonable_encoder
+    return Response(content=postModels.dumps(payload), media_type="application/json", **kwargs)
+
+async def cached_json_response(request: Request, key: tuple, ttl: float, load) -> Response:
+    """
+    先查回應快取，未命中才呼叫 load() 讀資料庫；回應附帶強 ETag，
+    瀏覽器或 CDN 帶 If-None-Match 且內容未變時回 304 (無 body)
+    剛寫入過的客戶端 (讀主庫期間) 不讀也不寫快取：快取可能是其他人剛從延遲的副本填入的舊內容
+    """
+    if dbRouting.primary_pinned.get():
+        body = postModels.dumps(await load())
+        cached = responseCache.CachedResponse(body, responseCache.make_etag(body))
+    else:
+        cached = response_cache.get(key)
+        if cached is None:
+            payload = await load()
+            cached = response_cache.set(key, postModels.dumps(payload), ttl)
+
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+    if responseCache.etag_matches(request.headers.get("if-none-match"), cached.etag):
+        response_cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
 @app.get("/api/health")
 async def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics")
+async def read_metrics():
+    return Response(content=metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/stats")
+async def read_stats():
+    return {
+        "session_cache": databaseOperate.session_cache.stats(),
+        "session_revocations": session_revocations.stats(),
+        "db_pool": databaseOperate.get_pool_stats(),
+        "password_pool": password.PasswordManager.stats(),
+        "response_cache": response_cache.stats(),
+        "cache_invalidations": cache_invalidations.stats(),
+        "chat": chat_hub.stats(),
+        "post_feed": post_feed.stats(),
+        "mail_queue": emailSender.mail_queue.stats(),
+        "rate_limiter": rate_limiter.stats(),
+        "expiry_sweeper": sweeper.stats(),
+        "feed_ranker": feed_ranker.stats(),
+        "view_counter": view_counter.stats()
+    }
+
 @app.get("/api/check-session")
-def check_session(request: Request, db: Session = Depends(databaseOperate.get_db), response: Response = None):
+async def check_session(request: Request, db: AsyncSession = Depends(databaseOperate.get_async_read_db), response: Response = None):
     token = request.cookies.get("auth_token")
     if not token:
         return None
 
     # 1. 從資料庫獲取資料
-    result = databaseOperate.get_user_by_session_dynamic(db, token)
+    result = await db.run_sync(databaseOperate.get_user_by_session_cached, token)
     
     if not result:
         response.delete_cookie(key="auth_token") # 清除無效的 Cookie
@@ -73,7 +250,7 @@ def check_session(request: Request, db: Session = Depends(databaseOperate.get_db
     # 2. 檢查時間邏輯
     # 資料庫儲存的是 UTC 時間，這裡也要用 datetime.now(timezone.utc)
     if datetime.now(timezone.utc) - result.created_at > timedelta(seconds=SESSION_EXPIRE_SEC):
-        databaseOperate.delete_user_session(db, token)
+        await db.run_sync(databaseOperate.delete_user_session, token)
         response.delete_cookie(key="auth_token")
         return None
 
@@ -84,57 +261,88 @@ def check_session(request: Request, db: Session = Depends(databaseOperate.get_db
     }
 
 @app.post("/api/register")
-def register(register_data: RegisterRequest, 
+async def register(register_data: RegisterRequest, 
            response: Response, 
-           db: Session = Depends(databaseOperate.get_db)):
-    is_valid = databaseOperate.verify_code(db, register_data.email, register_data.code)
+           _: None = Depends(limit_by_ip("check_code_ip")),
+           db: AsyncSession = Depends(databaseOperate.get_async_db)):
+    # 註冊同樣會檢查驗證碼，與 /api/check-code 共用限流，避免改從這裡暴力猜測
+    await rate_limiter.check(RATE_RULES["check_code_email"], (register_data.email or "").lower())
+    is_valid = await db.run_sync(databaseOperate.verify_code, register_data.email, register_data.code)
     if not is_valid:
         raise HTTPException(status_code=400, detail="驗證碼錯誤或失效，請重新操作")
     # 1. 檢查使用者名稱是否已存在
-    existing_user = databaseOperate.get_user_by_username(db, register_data.username)
+    existing_user = await db.run_sync(databaseOperate.get_user_by_username, register_data.username)
     if existing_user:
         raise HTTPException(status_code=400, detail="使用者名稱已被佔用")
-    if register_data.email and databaseOperate.get_user_by_email(db, register_data.email):
+    if register_data.email and await db.run_sync(databaseOperate.get_user_by_email, register_data.email):
         raise HTTPException(status_code=400, detail="此 Email 已被註冊")
 
-    hashed_pwd = password.PasswordManager.hash_password(register_data.password)
+    try:
+        hashed_pwd = await password.PasswordManager.hash_password_async(register_data.password)
+    except password.PasswordPoolBusy:
+        raise HTTPException(status_code=503, detail="系統忙碌中，請稍後再試")
 
     try:
-        new_id = databaseOperate.create_user(
-            db, 
+        new_id = await db.run_sync(
+            databaseOperate.create_user,
             username=register_data.username, 
             hashed_pwd=hashed_pwd, 
             email=register_data.email
         )
-        databaseOperate.delete_verification_code(db, register_data.email)
+        await db.run_sync(databaseOperate.delete_verification_code, register_data.email)
         return {"status": "success", "user_id": new_id, "message": "註冊成功！"}
     except Exception as e:
         print(f"Signup error: {e}")
         raise HTTPException(status_code=500, detail="註冊失敗")
 
 @app.post("/api/login")
-def login(login_data: LoginRequest, 
+async def login(login_data: LoginRequest, 
+          request: Request,
           response: Response, 
-          db: Session = Depends(databaseOperate.get_db)):
-    time.sleep(0.5)
+          _: None = Depends(limit_by_ip("login_ip")),
+          db: AsyncSession = Depends(databaseOperate.get_async_db)):
+    login_key = f"{login_data.name}|{rateLimiter.client_ip(request)}"
+    await rate_limiter.peek(RATE_RULES["login_user"], login_key)
+    started = time.monotonic()
+    try:
+        return await _login(login_data, response, db)
+    except HTTPException as e:
+        if e.status_code == 401:
+            await rate_limiter.record(RATE_RULES["login_user"], login_key)
+        raise
+    finally:
+        # 不阻塞 worker 的延遲：成功、失敗或錯誤都補足到同樣的最短時間
+        await asyncio.sleep(max(0.0, LOGIN_MIN_DURATION_SEC - (time.monotonic() - started)))
+
+async def _login(login_data: LoginRequest, response: Response, db: AsyncSession):
     # 1. 查詢使用者
-    user_result = databaseOperate.get_user_by_username(db, login_data.name)
+    user_result = await db.run_sync(databaseOperate.get_user_by_username, login_data.name)
 
-    if not user_result:
+    # 2. 驗證密碼 (查無帳號時也做一次假驗證，花費相同的 bcrypt 時間)
+    try:
+        is_valid = await password.PasswordManager.verify_password_async(
+            login_data.password,
+            user_result.password_hash if user_result else None
+        )
+    except password.PasswordPoolBusy:
+        raise HTTPException(status_code=503, detail="系統忙碌中，請稍後再試")
+    if not is_valid:
         raise HTTPException(status_code=401, detail="帳號或密碼錯誤，請重新輸入")
 
-    # 2. 驗證密碼
-    if not password.PasswordManager.verify_password(login_data.password, user_result.password_hash):
-        raise HTTPException(status_code=401, detail="帳號或密碼錯誤，請重新輸入")
+    # 2-1. bcrypt 強度調整過的話，趁有明文密碼時重新雜湊 (與 Session 在同一個交易寫入)
+    new_hash = None
+    if password.PasswordManager.needs_rehash(user_result.password_hash):
+        try:
+            new_hash = await password.PasswordManager.hash_password_async(login_data.password)
+        except password.PasswordPoolBusy:
+            pass
+
     # 3. Session Token
     token = secrets.token_urlsafe(32)
 
-    # 4. 寫入 Session (呼叫 databaseOperate)
+    # 4. 以單一語句取代舊 Session 並更新 last_login (一次 commit)
     try:
-        token_exist = databaseOperate.get_user_session_by_user_id(db, user_result.user_id)
-        if token_exist:
-            databaseOperate.delete_user_session(db, token_exist.session_token)
-        databaseOperate.create_user_session(db, user_result.user_id, token)
+        await db.run_sync(databaseOperate.replace_user_session, user_result.user_id, token, new_hash)
     except Exception as e:
         print(f"Database error: {e}")
         raise HTTPException(status_code=500, detail="系統錯誤，無法登入，請稍後再試。")
@@ -148,8 +356,6 @@ def login(login_data: LoginRequest,
         max_age=SESSION_EXPIRE_SEC
     )
     
-    databaseOperate.update_last_login(db, user_result.user_id)
-    
     return {
         "name": user_result.username,
         "user_id": str(user_result.user_id),
@@ -157,14 +363,14 @@ def login(login_data: LoginRequest,
     }
 
 @app.post("/api/logout")
-def logout(
+async def logout(
     response: Response, 
     auth_token: str = Cookie(None), 
-    db: Session = Depends(databaseOperate.get_db)
+    db: AsyncSession = Depends(databaseOperate.get_async_db)
 ):
     if auth_token:
         # 1. 從資料庫刪除該 Session (呼叫 databaseOperate)
-        databaseOperate.delete_user_session(db, auth_token)
+        await db.run_sync(databaseOperate.delete_user_session, auth_token)
 
     # 2. 叫瀏覽器刪除 Cookie
     response.delete_cookie(key="auth_token")
@@ -172,106 +378,453 @@ def logout(
     return {"status": "success", "message": "已成功登出"}
 
 @app.post("/api/send-code")
-def send_code(data: EmailSchema, background_tasks: BackgroundTasks, db: Session = Depends(databaseOperate.get_db)):
+async def send_code(data: EmailSchema, 
+                    _: None = Depends(limit_by_ip("send_code_ip")),
+                    db: AsyncSession = Depends(databaseOperate.get_async_db)):
+    await rate_limiter.check(RATE_RULES["send_code_email"], data.email.lower())
     # 檢查 Email 是否已經被註冊過
-    if databaseOperate.get_user_by_email(db, data.email):
+    if await db.run_sync(databaseOperate.get_user_by_email, data.email):
          raise HTTPException(status_code=400, detail="此 Email 已經被註冊")
 
     # 生成 6 位數驗證碼
     code = str(random.randint(100000, 999999))
     
     # 存入資料庫
-    databaseOperate.save_verification_code(db, data.email, code)
+    await db.run_sync(databaseOperate.save_verification_code, data.email, code)
     
-    # 關鍵：使用 BackgroundTasks 在背景寄信，才不會讓使用者卡在轉圈圈
-    background_tasks.add_task(emailSender.send_verification_email, data.email, code)
+    # 關鍵：交給背景寄信佇列 (共用 SMTP 連線、限速與重試)，才不會讓使用者卡在轉圈圈
+    try:
+        emailSender.mail_queue.enqueue(data.email, code)
+    except emailSender.MailQueueFull:
+        raise HTTPException(status_code=503, detail="系統忙碌中，請稍後再試")
     
     return {"message": "驗證碼已發送"}
 
 @app.post("/api/check-code")
-def check_code(req: VerificationRequest, db: Session = Depends(databaseOperate.get_db)):
+async def check_code(req: VerificationRequest, 
+                     _: None = Depends(limit_by_ip("check_code_ip")),
+                     db: AsyncSession = Depends(databaseOperate.get_async_db)):
     """
     前端在顯示帳號密碼欄位前，先呼叫這個 API 確認驗證碼是否正確
+    (依 IP 與 Email 限流，避免 6 位數驗證碼被暴力猜測)
     """
-    is_valid = databaseOperate.verify_code(db, req.email, req.code)
+    await rate_limiter.check(RATE_RULES["check_code_email"], req.email.lower())
+    is_valid = await db.run_sync(databaseOperate.verify_code, req.email, req.code)
     if not is_valid:
         raise HTTPException(status_code=400, detail="驗證碼錯誤或已過期")
     
     return {"message": "驗證成功", "status": "ok"}
 
-def get_current_user(request: Request, db: Session = Depends(databaseOperate.get_db)):
+async def get_current_user(request: Request, db: AsyncSession = Depends(databaseOperate.get_async_db)):
     """
     Dependency to get the current logged-in user from the cookie.
     Returns the user object if valid, otherwise raises 401.
     """
+    return await authenticate(request, db)
+
+async def get_current_reader(request: Request, db: AsyncSession = Depends(databaseOperate.get_async_read_db)):
+    """
+    只讀路由用的 get_current_user：與路由的 get_async_read_db 是同一個依賴，
+    驗證與後續查詢共用一個 Session，不會同時佔用兩條連線
+    """
+    return await authenticate(request, db)
+
+async def authenticate(request: Request, db: AsyncSession):
     token = request.cookies.get("auth_token")
     if not token:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    user_data = databaseOperate.get_user_by_session_dynamic(db, token)
+    user_data = await db.run_sync(databaseOperate.get_user_by_session_cached, token)
     
     if not user_data:
         raise HTTPException(status_code=401, detail="Session invalid")
 
     # Check expiration (reuse logic)
     if datetime.now(timezone.utc) - user_data.created_at > timedelta(seconds=SESSION_EXPIRE_SEC):
-        databaseOperate.delete_user_session(db, token)
+        await db.run_sync(databaseOperate.delete_user_session, token)
         raise HTTPException(status_code=401, detail="Session expired")
 
     return user_data
 
+# 管理員帳號 (逗號分隔的 username)，用於大量匯入 / 匯出等管理功能
+ADMIN_USERNAMES = {name.strip() for name in os.getenv("ADMIN_USERNAMES", "").split(",") if name.strip()}
+
+async def get_admin_user(user = Depends(get_current_user)):
+    if user.username not in ADMIN_USERNAMES:
+        raise HTTPException(status_code=403, detail="Admin only")
+    return user
+
 # 2. 修改 API 路由
 @app.post("/api/posts")
-def create_new_post(
+async def create_new_post(
     post: PostCreateRequest, 
     user = Depends(get_current_user),
-    db: Session = Depends(databaseOperate.get_db)
+    db: AsyncSession = Depends(databaseOperate.get_async_db)
 ):
     try:
         # 將資料傳給 databaseOperate
-        new_id = databaseOperate.create_post(
-            db, 
+        new_id = await db.run_sync(
+            databaseOperate.create_post,
             title=post.title, 
             content=post.content, 
             user_id=user.user_id,
             board_id=post.board_id,
             tags=post.tags
         )
-        return {"status": "success", "post_id": new_id, "message": "Post created successfully"}
+        response_cache.invalidate_namespace("posts")
     except Exception as e:
         print(f"Error creating post: {e}")
         raise HTTPException(status_code=500, detail="Failed to create post")
 
+    # 寫入成功後推播給所有 SSE 訂閱者 (推播失敗不影響發文結果)
+    try:
+        await post_feed.publish(postFeed.post_event(
+            new_id, post.title, post.board_id, post.tags,
+            {"name": user.username, "id": str(user.user_id)}
+        ))
+    except Exception as e:
+        print(f"Feed publish error: {e}")
+    return {"status": "success", "post_id": new_id, "message": "Post created successfully"}
+
 @app.get("/api/posts")
-def read_posts(
-    limit: int = 20, 
-    offset: int = 0, 
-    db: Session = Depends(databaseOperate.get_db)
+async def read_posts(
+    request: Request,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    board_id: Optional[int] = None,
+    tag: Optional[List[str]] = Query(None),
+    tag_mode: str = "any",
+    fields: str = "summary",
+    sort: str = "new"
+):
+    # 無限捲動請帶上一頁回傳的 next_cursor；舊的 offset 呼叫方式仍然可用
+    # sort=hot 依熱門分數 (瀏覽數與發文時間) 排序，篩選與分頁方式不變
+    # 標籤篩選可重複帶 tag=a&tag=b，tag_mode=any (任一) 或 all (全部)
+    # 列表預設只回傳摘要，需要完整內文請帶 fields=full 或改用 /api/posts/{post_id}
+    if tag_mode not in ("any", "all"):
+        raise HTTPException(status_code=400, detail="tag_mode must be 'any' or 'all'")
+    if fields not in ("summary", "full"):
+        raise HTTPException(status_code=400, detail="fields must be 'summary' or 'full'")
+    if sort not in ("new", "hot"):
+        raise HTTPException(status_code=400, detail="sort must be 'new' or 'hot'")
+    tags = sorted(set(tag)) if tag else None
+
+    async def load():
+        try:
+            async with databaseOperate.open_async_db(read_only=True) as db:
+                posts = await db.run_sync(
+                    databaseOperate.get_all_posts, limit, offset, cursor,
+                    board_id=board_id, tags=tags, tag_mode=tag_mode, fields=fields, sort=sort
+                )
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        return {
+            "status": "success",
+            "data": posts,
+            "next_cursor": databaseOperate.next_post_cursor(posts, limit, sort)
+        }
+
+    key = ("posts", limit, offset if not cursor else None, cursor,
+           board_id, tuple(tags) if tags else None, tag_mode if tags else None, fields, sort)
+    return await cached_json_response(request, key, POSTS_CACHE_TTL_SEC, load)
+
+@app.get("/api/feed")
+async def read_feed(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    user = Depends(get_current_reader),
+    db: AsyncSession = Depends(databaseOperate.get_async_read_db)
 ):
-    posts = databaseOperate.get_all_posts(db, limit, offset)
-    return {"status": "success", "data": posts}
+    """
+    登入使用者的個人化動態牆：最近的候選文章依 topic_weights (標籤 / 看板偏好) 與時間衰減排序
+    分頁請帶上一頁回傳的 next_cursor
+    """
+    ref_time = after = None
+    if cursor:
+        try:
+            ref_time, score, post_id = databaseOperate.decode_feed_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        after = (score, post_id)
+
+    # 快取未命中時沿用驗證時的 Session，不另外向連線池取連線
+    async def load_window(size: int):
+        return await db.run_sync(databaseOperate.get_all_posts, size)
+
+    async def load_weights():
+        profile = await db.run_sync(databaseOperate.get_user_profile, user.user_id)
+        return profile.topic_weights if profile else None
+
+    window = await feed_ranker.get_window(load_window)
+    tag_w, board_w = await feed_ranker.get_vectors(user.user_id, window, load_weights)
+    page, ref_time = feed_ranker.rank(window, tag_w, board_w, limit, ref_time, after)
+    next_cursor = None
+    if len(page) == limit:
+        last_post, last_score = page[-1]
+        next_cursor = databaseOperate.encode_cursor(ref_time, last_score, last_post.id)
+    return json_response({
+        "status": "success",
+        "data": [post for post, _ in page],
+        "next_cursor": next_cursor
+    })
+
+@app.get("/api/boards/counts")
+async def read_board_counts(request: Request):
+    async def load():
+        async with databaseOperate.open_async_db(read_only=True) as db:
+            counts = await db.run_sync(databaseOperate.get_board_counts)
+        return {"status": "success", "data": counts}
+
+    return await cached_json_response(request, ("posts", "board_counts"), COUNTS_CACHE_TTL_SEC, load)
+
+@app.get("/api/tags/counts")
+async def read_tag_counts(request: Request, limit: int = 50):
+    async def load():
+        async with databaseOperate.open_async_db(read_only=True) as db:
+            counts = await db.run_sync(databaseOperate.get_tag_counts, min(limit, 200))
+        return {"status": "success", "data": counts}
+
+    return await cached_json_response(request, ("posts", "tag_counts", limit), COUNTS_CACHE_TTL_SEC, load)
+
+@app.get("/api/search")
+async def search_posts(
+    q: str,
+    limit: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(databaseOperate.get_async_read_db)
+):
+    """
+    全文檢索文章標題與內容 (支援中文)，依相關度排序並附上標示關鍵字的摘要
+    """
+    try:
+        posts, next_cursor = await db.run_sync(databaseOperate.search_posts, q, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return json_response({"status": "success", "data": posts, "next_cursor": next_cursor})
+
+@app.get("/api/posts/stream")
+async def stream_posts(request: Request, board_id: Optional[int] = None, last_event_id: Optional[int] = None):
+    """
+    新文章的 SSE 串流，可用 board_id 篩選
+    重連時瀏覽器會自動帶 Last-Event-ID 標頭，從重播環補送錯過的文章
+    """
+    header_id = request.headers.get("last-event-id")
+    if header_id and header_id.isdigit():
+        last_event_id = int(header_id)
+
+    async def stream():
+        queue, replay, gap = post_feed.subscribe(last_event_id)
+        try:
+            yield "retry: 3000\n\n"
+            if gap:
+                # 錯過的事件已不在重播環內，請客戶端重新抓取文章列表
+                yield "event: reset\ndata: {}\n\n"
+            for event in replay:
+                if board_id is None or event.board_id == board_id:
+                    yield event.text
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=FEED_KEEPALIVE_SEC)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    break
+                if board_id is None or event.board_id == board_id:
+                    yield event.text
+        finally:
+            post_feed.unsubscribe(queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/api/posts/{post_id}")
-def read_single_post(post_id: int, db: Session = Depends(databaseOperate.get_db)):
-    post = databaseOperate.get_post_by_id(db, post_id)
-    if not post:
+async def read_single_post(request: Request, post_id: int):
+    async def load():
+        async with databaseOperate.open_async_db(read_only=True) as db:
+            post = await db.run_sync(databaseOperate.get_post_by_id, post_id)
+        if not post:
+            raise HTTPException(status_code=404, detail="Post not found")
+        return {"status": "success", "data": post}
+
+    response = await cached_json_response(request, ("post", post_id), POST_CACHE_TTL_SEC, load)
+    # 快取命中 (含 304) 也算一次瀏覽，不存在的文章 (404) 不算；只在記憶體累加，由 view_counter 定期批次寫回
+    view_counter.record(post_id)
+    return response
+
+@app.post("/api/posts/{post_id}/comments")
+async def create_new_comment(
+    post_id: int,
+    comment: CommentCreateRequest,
+    user = Depends(get_current_user),
+    db: AsyncSession = Depends(databaseOperate.get_async_db)
+):
+    """
+    在文章下留言，帶 parent_id 則為回覆該則留言
+    """
+    if not comment.content.strip():
+        raise HTTPException(status_code=400, detail="Comment content is required")
+    try:
+        new_comment = await db.run_sync(
+            databaseOperate.create_comment,
+            post_id=post_id,
+            user_id=user.user_id,
+            content=comment.content,
+            parent_id=comment.parent_id
+        )
+    except IntegrityError:
         raise HTTPException(status_code=404, detail="Post not found")
-    return {"status": "success", "data": post}
-
-# 假設你的 dist 資料夾路徑
-DIST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dist") 
-
-# ... 這裡放你的 API 路由 (@app.get("/api/...")) ...
+    except Exception as e:
+        print(f"Error creating comment: {e}")
+        raise HTTPException(status_code=500, detail="Failed to create comment")
+    if new_comment is None:
+        raise HTTPException(status_code=404, detail="Parent comment not found")
+
+    # 列表與單篇文章都帶有 comment_count，快取一併失效
+    response_cache.invalidate_namespace("posts")
+    response_cache.invalidate(("post", post_id))
+    return json_response({"status": "success", "data": new_comment})
+
+@app.get("/api/posts/{post_id}/comments")
+async def read_comments(
+    post_id: int,
+    parent_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(databaseOperate.get_async_read_db)
+):
+    """
+    依樹狀順序分頁取得文章留言 (depth 表示縮排層級)，帶 parent_id 則只取該留言底下的回覆
+    """
+    try:
+        comments, next_cursor = await db.run_sync(
+            databaseOperate.get_comments, post_id, parent_id, limit, cursor
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return json_response({"status": "success", "data": comments, "next_cursor": next_cursor})
 
-# ==========================================
-# 關鍵修正：掛載靜態檔案 (必須在 catchall 之前)
-# ==========================================
-# Vite 預設打包會將 JS/CSS 放在 dist/assets 資料夾下
-assets_path = os.path.join(DIST_DIR, "assets")
+@app.post("/api/admin/posts/import")
+async def import_posts(request: Request, job: str, format: str = "ndjson", admin = Depends(get_admin_user)):
+    """
+    以 NDJSON / CSV 請求本文大量匯入文章 (作者以 username 對應)
+    上傳內容先串流寫入暫存檔 (超過 IMPORT_MAX_UPLOAD_BYTES 回 413)，再以 COPY 分批匯入；中斷後以相同 job 重新上傳同一個檔案會從斷點繼續
+    """
+    if format not in bulkPosts.FORMATS:
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > IMPORT_MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="上傳檔案過大")
+    # 磁碟寫入都交給執行緒，不阻塞事件迴圈
+    upload = await asyncio.to_thread(tempfile.NamedTemporaryFile, suffix=f".{format}")
+    try:
+        received = 0
+        buffer = bytearray()
+        async for chunk in request.stream():
+            received += len(chunk)
+            # 沒有 Content-Length (chunked) 或宣告不實時，以實際收到的大小為準
+            if received > IMPORT_MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail="上傳檔案過大")
+            buffer += chunk
+            if len(buffer) >= IMPORT_WRITE_BUFFER_BYTES:
+                data, buffer = buffer, bytearray()
+                await asyncio.to_thread(upload.write, data)
+        await asyncio.to_thread(upload.write, buffer)
+        await asyncio.to_thread(upload.flush)
+        try:
+            report = await asyncio.to_thread(
+                bulkPosts.import_posts, upload.name, format, job, source=f"upload:{job}"
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        await asyncio.to_thread(upload.close)
+    response_cache.invalidate_namespace("posts")
+    return {"status": "success", "data": report}
+
+@app.get("/api/admin/posts/export")
+async def export_posts(format: str = "ndjson", board_id: Optional[int] = None, admin = Depends(get_admin_user)):
+    """
+    以 COPY TO STDOUT 串流匯出文章 (格式與匯入相同，可直接再匯入)
+    """
+    if format not in bulkPosts.FORMATS:
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+    return StreamingResponse(
+        bulkPosts.stream_export(format, board_id),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="posts.{format}"'}
+    )
 
-if os.path.exists(assets_path):
-    # 當瀏覽器請求 /assets/xxx.js 時，FastAPI 會直接從資料夾提供檔案
-    app.mount("/assets", StaticFiles(directory=assets_path), name="assets")
+@app.websocket("/api/ws/{room_type}/{room_id}")
+async def chat_socket(websocket: WebSocket, room_type: str, room_id: int):
+    """
+    看板 (/api/ws/boards/{board_id}) 或文章 (/api/ws/posts/{post_id}) 的聊天室
+    以 auth_token cookie 驗證身分；客戶端送出 {"text": "..."}，房間內所有人收到廣播
+    Origin 不在 ALLOWED_ORIGINS 的連線直接關閉，每條連線的發言次數受 chat_message 規則限制
+    """
+    if room_type not in ("boards", "posts"):
+        await websocket.close(code=1008)
+        return
+    # 瀏覽器一定會帶 Origin：其他網站的頁面不能借用使用者的 cookie 連進聊天室 (非瀏覽器客戶端沒有 Origin)
+    origin = websocket.headers.get("origin")
+    if origin is not None and origin not in ALLOWED_ORIGINS:
+        await websocket.close(code=1008)
+        return
+
+    token = websocket.cookies.get("auth_token")
+    user = None
+    if token:
+        try:
+            async with databaseOperate.open_async_db(read_only=True) as db:
+                user = await db.run_sync(databaseOperate.get_user_by_session_cached, token)
+        except HTTPException:
+            await websocket.close(code=1013)
+            return
+    if not user or datetime.now(timezone.utc) - user.created_at > timedelta(seconds=SESSION_EXPIRE_SEC):
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    room = f"{room_type}:{room_id}"
+    conn = chat_hub.connect(websocket, user)
+    chat_hub.join(conn, room)
+    sender = asyncio.create_task(chat_hub.sender(conn))
+    conn_key = secrets.token_hex(8)
+    try:
+        while True:
+            data = await websocket.receive_json()
+            text = str(data.get("text", "")).strip() if isinstance(data, dict) else ""
+            if not text:
+                continue
+            try:
+                await rate_limiter.check(RATE_RULES["chat_message"], conn_key)
+            except rateLimiter.RateLimited:
+                chat_hub.notify(conn, {"type": "error", "detail": "訊息傳送過於頻繁，請稍後再試"})
+                continue
+            try:
+                await chat_hub.publish(room, {
+                    "type": "message",
+                    "room": room,
+                    "text": text[:CHAT_MAX_MESSAGE_LEN],
+                    "author": {"name": user.username, "id": str(user.user_id)},
+                    "created_at": datetime.now(timezone.utc).isoformat()
+                })
+            except chatHub.BrokerUnavailable:
+                # broker 正在重新連線：告知這位使用者訊息沒送出，連線本身保留
+                chat_hub.notify(conn, {"type": "error", "detail": "訊息暫時無法送出，請稍後再試"})
+    except (WebSocketDisconnect, RuntimeError, ValueError):
+        # RuntimeError: 連線已被 sender 關閉 (慢速客戶端被踢除)；ValueError: 非 JSON 內容
+        pass
+    finally:
+        chat_hub.disconnect(conn)
+        sender.cancel()
 
 @app.get("/{catchall:path}")
 async def serve_react(request: Request, catchall: str):
@@ -279,16 +832,14 @@ async def serve_react(request: Request, catchall: str):
     if catchall.startswith("api/"):
         raise HTTPException(status_code=404, detail="API Not Found")
 
-    # 2. 嘗試尋找是否為根目錄的其他靜態檔 (如 favicon.ico, logo.png)
-    # 如果請求的是存在於 dist 根目錄的檔案，直接回傳該檔案
-    requested_file = os.path.join(DIST_DIR, catchall)
-    if os.path.exists(requested_file) and os.path.isfile(requested_file):
-        return FileResponse(requested_file)
+    # 2. 啟動時建立的 dist 檔案索引：/assets 底下的打包檔與根目錄靜態檔 (如 favicon.ico, logo.png)
+    asset = static_site.lookup("/" + catchall)
+    if asset is not None:
+        return static_site.respond(request, asset)
 
-    # 3. 如果都不是，回傳 index.html 讓 React Router 接手
-    index_path = os.path.join(DIST_DIR, "index.html")
-    if os.path.exists(index_path):
-        return FileResponse(index_path)
+    # 3. 如果都不是，回傳 index.html (記憶體中) 讓 React Router 接手
+    if static_site.index is not None:
+        return static_site.respond(request, static_site.index)
     
     # 4. 開發階段的 Fallback
     return HTMLResponse(content=f"""
@@ -304,4 +855,5 @@ async def serve_react(request: Request, catchall: str):
     """)
 
 if __name__ == "__main__":
+    # 開發模式 (單一 process + 自動重載)；正式環境請使用 python server.py
     uvicorn.run("main:app", host="127.0.0.1", port=9999, reload=True)
\ No newline at end of file
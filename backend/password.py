@@ -1,8 +1,33 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import bcrypt
 
+from metrics import PASSWORD_HASH_LATENCY
+
+# bcrypt 運算強度 (work factor)，調整後舊密碼會在下次登入成功時自動重新雜湊
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# 專用的雜湊執行緒數量與排隊上限 (bcrypt 運算時會釋放 GIL，用執行緒即可平行)
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "64"))
+
+class PasswordPoolBusy(Exception):
+    """
+    雜湊工作排隊已滿 (例如登入洪水)，呼叫端應回 503 而不是繼續堆積
+    """
+
 class PasswordManager:
+    # 執行緒池在 start() (或第一次使用時) 建立，shutdown() 後可以再 start()，同一個 process 可經歷多次 lifespan
+    _executor = None
+    _pending = 0
+    _lock = threading.Lock()
+    _dummy_hash = None
+
     @staticmethod
-    def hash_password(password: str) -> str:
+    def hash_password(password: str, rounds: int = None) -> str:
         """
         將明文密碼轉換為不可逆的雜湊值
         """
@@ -10,8 +35,8 @@ class PasswordManager:
         pwd_bytes = password.encode('utf-8')
         
         # 2. 產生鹽值 (Salt) 並進行雜湊
-        # gensalt() 預設的 rounds 是 12，這決定了運算強度
-        salt = bcrypt.gensalt()
+        # rounds 決定運算強度，預設讀取 BCRYPT_ROUNDS
+        salt = bcrypt.gensalt(rounds=rounds or BCRYPT_ROUNDS)
         hashed_password = bcrypt.hashpw(pwd_bytes, salt)
         
         # 3. 回傳解碼後的字串，以便存入資料庫 (PostgreSQL VARCHAR)
@@ -28,4 +53,194 @@ class PasswordManager:
                 hashed_password.encode('utf-8')
             )
         except Exception:
-            return False
\ No newline at end of file
+            return False
+
+    @staticmethod
+    def needs_rehash(hashed_password: str) -> bool:
+        """
+        雜湊值的運算強度與目前 BCRYPT_ROUNDS 不同時回傳 True
+        格式為 $2b$<rounds>$<salt+hash>
+        """
+        try:
+            return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+        except (IndexError, ValueError):
+            return True
+
+    @staticmethod
+    def _timed(op: str, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            PASSWORD_HASH_LATENCY.observe(time.perf_counter() - start, op)
+
+    @classmethod
+    async def _submit(cls, func, *args):
+        with cls._lock:
+            if cls._pending >= HASH_QUEUE_LIMIT:
+                raise PasswordPoolBusy()
+            cls._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            op = "hash" if func is cls.hash_password else "verify"
+            return await loop.run_in_executor(cls.start(), cls._timed, op, func, *args)
+        finally:
+            with cls._lock:
+                cls._pending -= 1
+
+    @classmethod
+    async def hash_password_async(cls, password: str) -> str:
+        """
+        在專用執行緒池中雜湊密碼，不佔用事件迴圈與一般 threadpool
+        """
+        return await cls._submit(cls.hash_password, password)
+
+    @classmethod
+    async def verify_password_async(cls, plain_password: str, hashed_password: str = None) -> bool:
+        """
+        在專用執行緒池中驗證密碼
+        hashed_password 為 None (查無此帳號) 時仍對假雜湊值做一次驗證，讓回應時間與帳號存在時一致
+        """
+        if hashed_password is None:
+            if cls._dummy_hash is None:
+                cls._dummy_hash = await cls._submit(cls.hash_password, "dummy-password")
+            await cls._submit(cls.verify_password, plain_password, cls._dummy_hash)
+            return False
+        return await cls._submit(cls.verify_password, plain_password, hashed_password)
+
+    @classmethod
+    def start(cls) -> ThreadPoolExecutor:
+        """
+        建立專用的雜湊執行緒池 (worker 啟動時呼叫，已建立則直接回傳)
+        """
+        with cls._lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+            return cls._executor
+
+    @classmethod
+    def shutdown(cls):
+        """
+        等待進行中的雜湊工作完成後關閉執行緒池 (worker 結束時呼叫)
+        """
+        with cls._lock:
+            executor, cls._executor = cls._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {
+            "workers": HASH_WORKERS,
+            "pending": cls._pending,
+            "queue_limit": HASH_QUEUE_LIMIT,
+            "rounds": BCRYPT_ROUNDS
+        }
+
+if __name__ == "__main__":
+    import argparse
+    import uuid
+    from datetime import datetime, timezone
+    from types import SimpleNamespace
+
+    parser = argparse.ArgumentParser(description="登入洪水期間量測登入吞吐量與其他 API (check-session) 的延遲：同步 bcrypt + time.sleep (舊) 與專用雜湊執行緒池 (新)")
+    parser.add_argument("--flood", type=int, default=100, help="同時送出登入請求的客戶端數")
+    parser.add_argument("--probes", type=int, default=4, help="同時呼叫 /api/check-session 的客戶端數")
+    parser.add_argument("--seconds", type=float, default=5, help="每種情境的量測秒數")
+    parser.add_argument("--rounds", type=int, default=BCRYPT_ROUNDS, help="bcrypt 運算強度")
+    args = parser.parse_args()
+    # main 匯入的是另一份 password 模組，運算強度在匯入前以環境變數指定 (與存好的雜湊相同，不會觸發重新雜湊)
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+
+    import httpx
+    from fastapi import FastAPI, HTTPException
+
+    import databaseOperate
+    import main
+    import rateLimiter
+
+    user = SimpleNamespace(user_id=uuid.uuid4(), username="alice", created_at=datetime.now(timezone.utc),
+                           password_hash=PasswordManager.hash_password("correct horse", args.rounds))
+
+    class StubDB:
+        """
+        代替 AsyncSession：不連資料庫，查使用者與 Session 都回傳同一個帳號，寫入直接略過
+        """
+        async def run_sync(self, func, *args, **kwargs):
+            if func in (databaseOperate.get_user_by_username, databaseOperate.get_user_by_session_cached):
+                return user
+            return None
+
+    async def stub_db():
+        yield StubDB()
+
+    # 新版：main.app 本身 (async 路由 + 雜湊執行緒池)，關掉限流以量測雜湊工作本身的影響
+    main.app.dependency_overrides[databaseOperate.get_async_db] = stub_db
+    main.app.dependency_overrides[databaseOperate.get_async_read_db] = stub_db
+    main.RATE_RULES = {name: rule._replace(limit=10 ** 9) for name, rule in main.RATE_RULES.items()}
+    main.rate_limiter = rateLimiter.RateLimiter(rateLimiter.MemoryBackend())
+
+    # 舊版：同步路由在 FastAPI 的 threadpool 中 time.sleep(0.5) 後直接做 bcrypt，check-session 也是同步路由
+    before = FastAPI()
+
+    @before.post("/api/login")
+    def old_login(login_data: main.LoginRequest):
+        time.sleep(0.5)
+        if not PasswordManager.verify_password(login_data.password, user.password_hash):
+            raise HTTPException(status_code=401, detail="帳號或密碼錯誤，請重新輸入")
+        return {"name": user.username, "user_id": str(user.user_id), "status": "success"}
+
+    @before.get("/api/check-session")
+    def old_check_session():
+        return {"name": user.username, "user_id": str(user.user_id)}
+
+    async def run(app, flood: int):
+        transport = httpx.ASGITransport(app=app)
+        statuses = {}
+        latencies = []
+        # 以截止時間結束 (不用 Event + sleep 計時)
+        deadline = time.perf_counter() + args.seconds
+
+        async def login_loop(client, n):
+            i = n
+            while time.perf_counter() < deadline:
+                i += 1
+                body = {"name": "alice", "password": "correct horse" if i % 2 else "wrong"}
+                response = await client.post("/api/login", json=body)
+                if time.perf_counter() < deadline:
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def probe_loop(client):
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                response = await client.get("/api/check-session")
+                assert response.status_code == 200
+                latencies.append(time.perf_counter() - start)
+                # 代替真實伺服器的 socket I/O：stub 資料庫的請求不會讓出事件迴圈，其他 task 會被餓死
+                await asyncio.sleep(0)
+
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as flood_client, \
+                httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None,
+                                  cookies={"auth_token": "bench"}) as probe_client:
+            tasks = [asyncio.create_task(login_loop(flood_client, n)) for n in range(flood)]
+            tasks += [asyncio.create_task(probe_loop(probe_client)) for _ in range(args.probes)]
+            await asyncio.gather(*tasks)
+        latencies.sort()
+        logins = statuses.get(200, 0) + statuses.get(401, 0)
+        p = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000 if latencies else float("nan")
+        print(f"  logins {logins / args.seconds:6.1f}/s {dict(sorted(statuses.items()))}; "
+              f"check-session {len(latencies) / args.seconds:7.1f} req/s, p50 {p(0.5):8.1f} ms, p99 {p(0.99):8.1f} ms")
+
+    async def bench():
+        print(f"bcrypt rounds {args.rounds}, {os.cpu_count()} CPU, {main.password.HASH_WORKERS} hash workers, "
+              f"{args.flood} flooding clients, {args.probes} check-session clients, {args.seconds:g}s per case")
+        for name, app in (("before (sync bcrypt + time.sleep)", before), ("after (hash pool + async delay)", main.app)):
+            print(f"{name}, no flood:")
+            await run(app, 0)
+            print(f"{name}, login flood:")
+            await run(app, args.flood)
+
+    try:
+        asyncio.run(bench())
+    finally:
+        main.password.PasswordManager.shutdown()
@@ -0,0 +1,112 @@
+import asyncio
+import json
+from collections import deque, namedtuple
+
+from chatHub import Broker
+
+# 已格式化好的 SSE 事件：每則新文章只序列化一次，所有分頁共用
+# seq 為本 worker 收到事件的順序 (broker 轉送的順序)，重播依 seq 而不是文章 id
+FeedEvent = namedtuple("FeedEvent", ["seq", "id", "board_id", "text"])
+
+# 事件只帶列表需要的摘要欄位並限制長度：NOTIFY 的 payload 上限約 8000 bytes，
+# 超過時整則事件會發佈失敗；其餘內容由客戶端以 /api/posts/{post_id} 取得
+EVENT_TITLE_LEN = 200
+EVENT_MAX_TAGS = 10
+EVENT_TAG_LEN = 50
+
+def post_event(post_id: int, title: str, board_id, tags: list, author: dict) -> dict:
+    """
+    組出新文章事件 (長度有上限，序列化後遠小於 NOTIFY 的上限)
+    """
+    return {
+        "id": post_id,
+        "title": title[:EVENT_TITLE_LEN],
+        "board_id": board_id,
+        "tags": [tag[:EVENT_TAG_LEN] for tag in tags[:EVENT_MAX_TAGS]],
+        "author": author
+    }
+
+def format_sse(event_id: int, event: str, data: dict) -> str:
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+class PostFeed:
+    """
+    新文章的即時推播 (Server-Sent Events)
+    - 事件 id 直接使用文章 id，客戶端重連時帶 Last-Event-ID，從重播環中該事件之後的位置補回錯過的事件
+      (文章 id 來自 sequence，交易可能不依 id 順序 commit，所以不能以「id 比較大」判斷是否錯過)
+    - 重播環中找不到 Last-Event-ID (錯過太多或 worker 剛啟動) 時回傳 gap，由呼叫端通知客戶端重新抓列表
+    - 透過 Broker 轉送，多個 worker 的訂閱者都會收到 (LISTEN/NOTIFY 依 commit 順序送達每個 worker)
+    - close() 時結束所有串流，不會讓開著的 SSE 連線拖住 worker 的正常關閉
+    """
+    def __init__(self, broker: Broker, ring_size: int = 512, queue_size: int = 256):
+        self.broker = broker
+        self.queue_size = queue_size
+        self._ring = deque(maxlen=ring_size)
+        self._seq = 0
+        self._positions = {}  # 文章 id -> 重播環中的 seq
+        self._subscribers = set()
+        self.published = 0
+        self.dropped_subscribers = 0
+
+    async def start(self):
+        await self.broker.start(self._on_event)
+
+    async def close(self):
+        await self.broker.close()
+        for queue in list(self._subscribers):
+            self._end(queue)
+        self._subscribers.clear()
+
+    @staticmethod
+    def _end(queue):
+        # 佇列中的 None 讓串流結束 (佇列已滿時先清空)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    async def publish(self, post: dict):
+        await self.broker.publish("posts", post)
+
+    def _on_event(self, room: str, post: dict):
+        self._seq += 1
+        event = FeedEvent(self._seq, post["id"], post.get("board_id"), format_sse(post["id"], "post", post))
+        if len(self._ring) == self._ring.maxlen:
+            evicted = self._ring[0]
+            if self._positions.get(evicted.id) == evicted.seq:
+                del self._positions[evicted.id]
+        self._ring.append(event)
+        self._positions[event.id] = event.seq
+        self.published += 1
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # 跟不上的訂閱者直接結束串流，客戶端會帶 Last-Event-ID 重連補資料
+                self._subscribers.discard(queue)
+                self.dropped_subscribers += 1
+                self._end(queue)
+
+    def subscribe(self, last_event_id: int = None):
+        """
+        回傳 (佇列, 需要重播的事件, 是否有遺漏)
+        """
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        if last_event_id is None:
+            return queue, [], False
+        seq = self._positions.get(last_event_id)
+        if seq is None:
+            return queue, [], True
+        replay = [event for event in self._ring if event.seq > seq]
+        return queue, replay, False
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "replay_size": len(self._ring),
+            "dropped_subscribers": self.dropped_subscribers
+        }
@@ -0,0 +1,167 @@
+import argparse
+import json
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+import orjson
+
+# 文章 API 的回應型別
+# 直接由 SQLAlchemy Row 建立 slots dataclass，再交給 orjson 一次序列化成 bytes，
+# 不經過中間的 dict 與 jsonable_encoder (orjson 原生支援 dataclass 與 datetime)
+
+@dataclass(slots=True)
+class Author:
+    name: str
+    id: str
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row.username, str(row.user_id))
+
+@dataclass(slots=True)
+class PostSummary:
+    id: int
+    title: str
+    excerpt: Optional[str]
+    content_length: Optional[int]  # 純文字字元數，大於 excerpt 長度代表摘要被截斷
+    created_at: datetime
+    board_id: Optional[int]
+    tags: List[str]
+    comment_count: int
+    view_count: int
+    hot_score: float
+    author: Author
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row.id, row.title, row.excerpt, row.content_length, row.created_at, row.board_id,
+                   row.tags, row.comment_count, row.view_count, row.hot_score, Author.from_row(row))
+
+@dataclass(slots=True)
+class PostSummaryWithContent(PostSummary):
+    content: str
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row.id, row.title, row.excerpt, row.content_length, row.created_at, row.board_id,
+                   row.tags, row.comment_count, row.view_count, row.hot_score, Author.from_row(row), row.content)
+
+@dataclass(slots=True)
+class PostDetail:
+    id: int
+    title: str
+    content: str
+    created_at: datetime
+    board_id: Optional[int]
+    tags: List[str]
+    comment_count: int
+    author: Author
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row.id, row.title, row.content, row.created_at,
+                   row.board_id, row.tags, row.comment_count, Author.from_row(row))
+
+@dataclass(slots=True)
+class SearchHit:
+    id: int
+    title: str
+    snippet: str
+    created_at: datetime
+    board_id: Optional[int]
+    tags: List[str]
+    rank: float
+    author: Author
+
+@dataclass(slots=True)
+class Comment:
+    id: int
+    post_id: int
+    parent_id: Optional[int]
+    depth: int
+    content: str
+    created_at: datetime
+    author: Author
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row.id, row.post_id, row.parent_id, row.depth,
+                   row.content, row.created_at, Author.from_row(row))
+
+def dumps(payload) -> bytes:
+    """
+    序列化 API 回應 (dataclass / dict / list) 為 JSON bytes
+    """
+    return orjson.dumps(payload, default=str)
+
+if __name__ == "__main__":
+    import random
+    import uuid
+    from collections import namedtuple
+    from datetime import timedelta, timezone
+
+    from fastapi.encoders import jsonable_encoder
+
+    from searchIndex import html_to_text
+
+    parser = argparse.ArgumentParser(description="比較文章列表的序列化：逐筆 dict + jsonable_encoder + json (舊) 與 dataclass + orjson (新)，"
+                                                 "以及摘要 (預設) 與完整內文 (fields=full) 的回應大小")
+    parser.add_argument("--posts", type=int, default=100, help="每頁文章數")
+    parser.add_argument("--content", type=int, nargs="+", default=[2000, 20000], help="每篇內文長度 (HTML 字元數)，可指定多個")
+    parser.add_argument("--rounds", type=int, default=500, help="量測次數")
+    args = parser.parse_args()
+
+    # 欄位與 get_all_posts 的查詢結果相同 (namedtuple 和 SQLAlchemy Row 一樣以屬性存取)
+    Row = namedtuple("Row", ["id", "title", "excerpt", "content_length", "content", "created_at", "board_id",
+                             "tags", "comment_count", "view_count", "hot_score", "username", "user_id"])
+    paragraph = "<p>一隻貓在睡覺，醒來後去吃飯。The quick brown fox jumps.</p>"
+
+    def make_rows(content_size: int) -> list:
+        rng = random.Random(0)
+        now = datetime.now(timezone.utc)
+        content = (paragraph * (content_size // len(paragraph) + 1))[:content_size]
+        plain_text = html_to_text(content)
+        return [
+            Row(i + 1, f"文章標題 {i}", plain_text[:200], len(plain_text), content,
+                now - timedelta(minutes=rng.randint(0, 100000)), rng.randint(1, 20), ["貓", "日常"],
+                rng.randint(0, 50), rng.randint(0, 10000), rng.random() * 40,
+                f"user{i % 17}", uuid.UUID(int=rng.getrandbits(128)))
+            for i in range(args.posts)
+        ]
+
+    def before(rows):
+        # 原本的寫法：get_all_posts 逐筆組 dict，FastAPI 再以 jsonable_encoder + 標準庫 json 編碼 (JSONResponse.render)
+        posts = [{
+            "id": row.id, "title": row.title, "content": row.content, "created_at": row.created_at,
+            "board_id": row.board_id, "tags": row.tags,
+            "author": {"name": row.username, "id": row.user_id}
+        } for row in rows]
+        payload = jsonable_encoder({"status": "success", "data": posts})
+        return json.dumps(payload, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+    def with_content(rows):
+        return dumps({"status": "success", "data": [PostSummaryWithContent.from_row(row) for row in rows]})
+
+    def summary(rows):
+        return dumps({"status": "success", "data": [PostSummary.from_row(row) for row in rows]})
+
+    for content_size in args.content:
+        rows = make_rows(content_size)
+        print(f"{args.posts} posts per page, {content_size} chars of content, {args.rounds} rounds")
+        baseline = None
+        for name, func in (("dict + jsonable_encoder + json (before)", before),
+                           ("dataclass + orjson, fields=full", with_content),
+                           ("dataclass + orjson, summary (default)", summary)):
+            size = len(func(rows))
+            timings = []
+            for _ in range(args.rounds):
+                start = time.perf_counter()
+                func(rows)
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            p50 = timings[len(timings) // 2]
+            baseline = baseline or p50
+            print(f"  {name:40s} p50 {p50 * 1e6:7.0f} µs/page, p99 {timings[int(len(timings) * 0.99) - 1] * 1e6:7.0f} µs, "
+                  f"{size / 1024:7.1f} KiB, x{baseline / p50:.1f}")
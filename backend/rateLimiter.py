@@ -0,0 +1,130 @@
+import math
+import threading
+import time
+from collections import namedtuple
+
+from fastapi import HTTPException, Request
+
+# name: 規則名稱 (也是 key 前綴)，limit: 每個視窗允許的次數，window_sec: 視窗長度
+Rule = namedtuple("Rule", ["name", "limit", "window_sec"])
+
+class MemoryBackend:
+    """
+    單一 process 的計數器 (開發環境或只有一個 worker 時)
+    每個 key 只保留目前與前一個視窗的次數
+    """
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self._data = {}  # key -> [視窗編號, 目前次數, 前一視窗次數]
+        self._lock = threading.Lock()
+
+    async def hit(self, key: str, window_index: int, window_sec: int):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < window_index - 1:
+                entry = [window_index, 0, 0]
+            elif entry[0] == window_index - 1:
+                entry = [window_index, 0, entry[1]]
+            entry[1] += 1
+            self._data[key] = entry
+            if len(self._data) > self.maxsize:
+                self._purge(window_index)
+            return entry[1], entry[2]
+
+    async def peek(self, key: str, window_index: int, window_sec: int):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < window_index - 1:
+                return 0, 0
+            if entry[0] == window_index - 1:
+                return 0, entry[1]
+            return entry[1], entry[2]
+
+    def _purge(self, window_index: int):
+        for key in [k for k, v in self._data.items() if v[0] < window_index - 1]:
+            del self._data[key]
+        # 全部都還在有效視窗內時，丟掉最舊的一半避免無限成長
+        if len(self._data) > self.maxsize:
+            for key in list(self._data)[:len(self._data) // 2]:
+                del self._data[key]
+
+class RedisBackend:
+    """
+    多個 worker 共用的計數器 (需要 redis 套件與 REDIS_URL)
+    """
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+
+    async def hit(self, key: str, window_index: int, window_sec: int):
+        current_key = f"rl:{key}:{window_index}"
+        previous_key = f"rl:{key}:{window_index - 1}"
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.incr(current_key)
+            pipe.expire(current_key, window_sec * 2)
+            pipe.get(previous_key)
+            current, _, previous = await pipe.execute()
+        return int(current), int(previous or 0)
+
+    async def peek(self, key: str, window_index: int, window_sec: int):
+        current, previous = await self._redis.mget(f"rl:{key}:{window_index}", f"rl:{key}:{window_index - 1}")
+        return int(current or 0), int(previous or 0)
+
+class RateLimited(HTTPException):
+    def __init__(self, retry_after: int):
+        super().__init__(
+            status_code=429,
+            detail="請求過於頻繁，請稍後再試",
+            headers={"Retry-After": str(retry_after)}
+        )
+
+class RateLimiter:
+    """
+    滑動視窗限流 (以前一視窗次數依經過比例加權估算)，在任何資料庫或 bcrypt 工作之前擋下過量請求
+    """
+    def __init__(self, backend):
+        self.backend = backend
+        self.rejected = {}
+
+    async def check(self, rule: Rule, identity: str):
+        """
+        計入這次請求，超過上限時拋出 RateLimited
+        """
+        await self._count(rule, identity, self.backend.hit, rule.limit)
+
+    async def peek(self, rule: Rule, identity: str):
+        """
+        不計入這次請求，已用完額度時拋出 RateLimited (搭配 record 只計算失敗的嘗試)
+        """
+        await self._count(rule, identity, self.backend.peek, rule.limit - 1)
+
+    async def record(self, rule: Rule, identity: str):
+        """
+        只計入一次，不檢查上限
+        """
+        if identity:
+            await self.backend.hit(f"{rule.name}:{identity}", int(time.time() // rule.window_sec), rule.window_sec)
+
+    async def _count(self, rule: Rule, identity: str, read, allowed: int):
+        if not identity:
+            return
+        now = time.time()
+        window_index = int(now // rule.window_sec)
+        elapsed = (now % rule.window_sec) / rule.window_sec
+        current, previous = await read(f"{rule.name}:{identity}", window_index, rule.window_sec)
+        estimated = previous * (1 - elapsed) + current
+        if estimated > allowed:
+            self.rejected[rule.name] = self.rejected.get(rule.name, 0) + 1
+            raise RateLimited(max(1, math.ceil(rule.window_sec * (1 - elapsed))))
+
+    def stats(self) -> dict:
+        return {"rejected": dict(self.rejected)}
+
+def create_backend(kind: str, url: str = None):
+    if kind == "redis":
+        return RedisBackend(url)
+    return MemoryBackend()
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else ""
@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# body 為已序列化的 JSON bytes，etag 為對應的強 ETag
+CachedResponse = namedtuple("CachedResponse", ["body", "etag"])
+
+def make_etag(body: bytes) -> str:
+    """
+    依回應內容產生強 ETag (內容相同 ETag 就相同，多個 worker 之間也一致)
+    """
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    比對 If-None-Match 標頭 (可能是逗號分隔的多個值、W/ 前綴或 *)
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+class ResponseCache:
+    """
+    API 回應快取 (LRU + TTL)，key 為 tuple，第一個元素是命名空間 (例如 "posts"、"post")
+    寫入時可依命名空間整批失效；每個 worker 各一份，失效時由 InvalidationBroadcaster 通知其他 worker
+    """
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()  # key -> (過期時間 monotonic, CachedResponse)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        # 每分鐘命中次數 (= 省下的 DB 查詢)：目前這一分鐘與上一分鐘
+        self._minute = 0
+        self._minute_hits = 0
+        self._last_minute_hits = 0
+        # 失效時的通知 (由 InvalidationBroadcaster 設定，轉送給其他 worker)
+        self.on_invalidate = None
+
+    def _count_hit(self):
+        minute = int(time.time() // 60)
+        if minute != self._minute:
+            self._last_minute_hits = self._minute_hits if minute == self._minute + 1 else 0
+            self._minute = minute
+            self._minute_hits = 0
+        self._minute_hits += 1
+        self.hits += 1
+
+    def get(self, key: tuple):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self._count_hit()
+            return entry[1]
+
+    def set(self, key: tuple, body: bytes, ttl: float) -> CachedResponse:
+        cached = CachedResponse(body, make_etag(body))
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, cached)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return cached
+
+    def invalidate(self, key: tuple, broadcast: bool = True):
+        """
+        移除單一 key；broadcast=False 只清除本 worker (收到其他 worker 的通知時)
+        """
+        with self._lock:
+            self._data.pop(key, None)
+        if broadcast and self.on_invalidate is not None:
+            self.on_invalidate({"key": list(key)})
+
+    def invalidate_namespace(self, namespace: str, broadcast: bool = True):
+        with self._lock:
+            for key in [k for k in self._data if k[0] == namespace]:
+                del self._data[key]
+        if broadcast and self.on_invalidate is not None:
+            self.on_invalidate({"namespace": namespace})
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._data)
+            current_minute = int(time.time() // 60)
+            if current_minute == self._minute:
+                last_minute = self._last_minute_hits
+            elif current_minute == self._minute + 1:
+                last_minute = self._minute_hits
+            else:
+                last_minute = 0
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "db_queries_saved_last_minute": last_minute
+        }
+
+class InvalidationBroadcaster:
+    """
+    透過 Broker 把回應快取的失效 (發文、留言、匯入) 廣播給所有 worker，
+    其他 worker 的文章列表與單篇文章快取也立即清除，不必等 TTL 到期
+    與 sessionCache.RevocationBroadcaster 相同：先排回事件迴圈再發佈
+    """
+    def __init__(self, cache: ResponseCache, broker, room: str = "response_cache"):
+        self.cache = cache
+        self.broker = broker
+        self.room = room
+        self._loop = None
+        self._tasks = set()
+        self.published = 0
+        self.received = 0
+        self.failures = 0
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        await self.broker.start(self._on_message)
+        self.cache.on_invalidate = self.publish
+
+    def publish(self, message: dict):
+        if self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._spawn, message)
+
+    def _spawn(self, message: dict):
+        task = asyncio.create_task(self._send(message))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, message: dict):
+        try:
+            await self.broker.publish(self.room, message)
+            self.published += 1
+        except Exception as e:
+            self.failures += 1
+            print(f"Response cache invalidation broadcast failed: {e}")
+
+    def _on_message(self, room: str, message: dict):
+        self.received += 1
+        if "namespace" in message:
+            self.cache.invalidate_namespace(message["namespace"], broadcast=False)
+        else:
+            self.cache.invalidate(tuple(message["key"]), broadcast=False)
+
+    async def close(self):
+        self.cache.on_invalidate = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._loop = None
+        await self.broker.close()
+
+    def stats(self) -> dict:
+        return {"published": self.published, "received": self.received, "failures": self.failures}
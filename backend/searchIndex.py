@@ -0,0 +1,105 @@
+import argparse
+import html
+import re
+
+# 中日韓文字 (漢字、假名、韓文) 沒有空白分詞，PostgreSQL 內建 parser 會把整段當成一個字，
+# 所以在寫入前先切成重疊的二元組 (bigram)，再交給 'simple' 設定建立 tsvector
+# 文章另外索引每個單字 (unigram)，只輸入一個字的查詢 (例如「貓」) 才找得到；
+# 兩個字以上的查詢只用 bigram，相鄰字必須同時出現，不會被單字大量命中稀釋
+# (分詞規則變更後，既有文章以 python backend/searchIndex.py --all 重建索引)
+CJK_CHARS = "㐀-䶿一-鿿豈-﫿぀-ヿ가-힯"
+_TOKEN_RE = re.compile(f"[{CJK_CHARS}]+|[^\\W_{CJK_CHARS}]+")
+_CJK_RE = re.compile(f"[{CJK_CHARS}]")
+_TAG_RE = re.compile(r"<[^>]+>")
+_SPACE_RE = re.compile(r"\s+")
+
+def html_to_text(content: str) -> str:
+    """
+    文章內容是編輯器產生的 HTML，去掉標籤後轉成純文字
+    """
+    text = html.unescape(_TAG_RE.sub(" ", content or ""))
+    return _SPACE_RE.sub(" ", text).strip()
+
+def tokenize(text: str, unigrams: bool = False) -> list:
+    """
+    CJK 連續字串切成 bigram (單一字保留原字)，其他文字以單字為單位並轉小寫
+    unigrams=True 時 (建立文章索引) 兩個字以上的 CJK 字串也加入每個單字
+    """
+    tokens = []
+    for match in _TOKEN_RE.finditer(text or ""):
+        word = match.group(0)
+        if _CJK_RE.match(word):
+            if len(word) == 1:
+                tokens.append(word)
+            else:
+                tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+                if unigrams:
+                    tokens.extend(word)
+        else:
+            tokens.append(word.lower())
+    return tokens
+
+def to_document(text: str) -> str:
+    """
+    轉成以空白分隔的 token 字串，供 to_tsvector 建立文章索引
+    """
+    return " ".join(tokenize(text, unigrams=True))
+
+def to_query(text: str) -> str:
+    """
+    轉成以空白分隔的 token 字串，供 plainto_tsquery 使用 (單一字的查詢對應文章的 unigram)
+    """
+    return " ".join(tokenize(text))
+
+def build_snippet(content: str, query: str, width: int = 60) -> str:
+    """
+    從文章純文字中擷取第一個命中關鍵字附近的片段，並以 <mark> 標示關鍵字
+    (回傳值已做 HTML escape，可直接顯示)
+    """
+    text = html_to_text(content)
+    terms = sorted({m.group(0) for m in _TOKEN_RE.finditer(query or "")}, key=len, reverse=True)
+    if not terms:
+        return html.escape(text[:width * 2])
+
+    pattern = re.compile("|".join(re.escape(term) for term in terms), re.IGNORECASE)
+    first = pattern.search(text)
+    start = max(0, first.start() - width) if first else 0
+    end = min(len(text), start + width * 2)
+    fragment = text[start:end]
+
+    parts = []
+    last = 0
+    for match in pattern.finditer(fragment):
+        parts.append(html.escape(fragment[last:match.start()]))
+        parts.append(f"<mark>{html.escape(match.group(0))}</mark>")
+        last = match.end()
+    parts.append(html.escape(fragment[last:]))
+    snippet = "".join(parts)
+    if start > 0:
+        snippet = "…" + snippet
+    if end < len(text):
+        snippet = snippet + "…"
+    return snippet
+
+if __name__ == "__main__":
+    import databaseOperate
+
+    parser = argparse.ArgumentParser(description="為既有文章補建全文檢索欄位 (search_vector)")
+    parser.add_argument("--batch", type=int, default=500, help="每批處理的文章數")
+    parser.add_argument("--all", action="store_true", help="重建所有文章 (分詞規則變更後使用)，預設只補建空白的")
+    args = parser.parse_args()
+
+    databaseOperate.init_engines()
+    db = databaseOperate.SessionLocal()
+    try:
+        total = 0
+        last_id = 0
+        while True:
+            updated, last_id = databaseOperate.backfill_search_vectors(db, last_id, args.batch, args.all)
+            if last_id is None:
+                break
+            total += updated
+            print(f"backfilled {total} posts (last id {last_id})")
+        print(f"done, {total} posts indexed")
+    finally:
+        db.close()
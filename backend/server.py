@@ -0,0 +1,58 @@
+import importlib.util
+import os
+
+import uvicorn
+
+# 正式環境啟動入口：多個 worker process，每個 worker 在 lifespan 中各自建立連線池與背景工作
+# 設定皆由環境變數提供：
+#   HOST / PORT           監聽位址 (預設 0.0.0.0:9999)
+#   WEB_CONCURRENCY       worker 數 (預設為 CPU 核心數，未設定共用後端時為 1)
+#   GRACEFUL_TIMEOUT      收到 SIGTERM 後等待進行中請求的秒數
+#   DATABASE_URL、DB_POOL_* 等資料庫設定見 databaseOperate.py
+#   CHAT_BROKER=postgres、RATE_LIMIT_BACKEND=redis  多個 worker 時必須設定，否則拒絕啟動 (未指定 worker 數時改用 1 個)
+
+# 預設值只在單一 process 內有效的設定：(環境變數, 跨 worker 共用時的值, 只用記憶體時的後果)
+SHARED_STATE_SETTINGS = [
+    ("CHAT_BROKER", "postgres", "聊天室、新文章推播與 Session / 回應快取的失效通知只會送到同一個 worker"),
+    ("RATE_LIMIT_BACKEND", "redis", "限流計數各 worker 分開，實際上限變成 worker 數倍"),
+]
+
+def _has_module(name: str) -> bool:
+    return importlib.util.find_spec(name) is not None
+
+def _process_local_state() -> list:
+    """
+    回傳仍使用 process 內記憶體的設定說明 (空清單代表可以安全地開多個 worker)
+    """
+    return [
+        f"{name}={os.getenv(name, 'memory')} ({name}={shared} 才會跨 worker 共用)：{effect}"
+        for name, shared, effect in SHARED_STATE_SETTINGS
+        if os.getenv(name, "memory") != shared
+    ]
+
+def main():
+    configured = int(os.getenv("WEB_CONCURRENCY", "0"))
+    workers = configured or os.cpu_count() or 1
+    local_state = _process_local_state()
+    if workers > 1 and local_state:
+        details = "\n".join(f"  - {line}" for line in local_state)
+        if configured:
+            # 明確要求多個 worker 卻沒有共用後端：拒絕啟動，避免行為悄悄變得不一致
+            raise SystemExit(f"WEB_CONCURRENCY={workers} 需要跨 worker 共用的後端：\n{details}")
+        print(f"⚠️ 未設定共用後端，改用單一 worker (設定後可用 WEB_CONCURRENCY 指定 worker 數)：\n{details}")
+        workers = 1
+    uvicorn.run(
+        "main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "9999")),
+        workers=workers,
+        # 有安裝 uvloop / httptools 時使用，較快的事件迴圈與 HTTP parser
+        loop="uvloop" if _has_module("uvloop") else "asyncio",
+        http="httptools" if _has_module("httptools") else "h11",
+        proxy_headers=True,
+        timeout_graceful_shutdown=int(os.getenv("GRACEFUL_TIMEOUT", "30")),
+        log_level=os.getenv("LOG_LEVEL", "info"),
+    )
+
+if __name__ == "__main__":
+    main()
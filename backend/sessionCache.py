@@ -0,0 +1,168 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timezone
+
+# 快取內容只保留驗證 Session 需要的欄位，屬性名稱與資料庫查詢結果相同
+CachedSession = namedtuple("CachedSession", ["user_id", "username", "created_at"])
+
+class SessionCache:
+    """
+    以 Session Token 為 key 的 LRU + TTL 快取 (單一 process 內共用)
+    - 正向結果在 Session 到期 (created_at + expire_sec) 時失效，並受 max_ttl 上限限制
+    - 查無此 Token 的結果只快取 negative_ttl 秒
+    - 失效的 Token 留下 revoked_ttl 秒的墓碑：在失效前就開始、失效後才完成的查詢
+      (讀到 commit 前的資料列) 不會把已撤銷的 Token 再寫回快取
+    """
+    def __init__(self, expire_sec: int, maxsize: int = 10000, max_ttl: int = 300, negative_ttl: int = 5,
+                 revoked_ttl: int = 60):
+        self.expire_sec = expire_sec
+        self.maxsize = maxsize
+        self.max_ttl = max_ttl
+        self.negative_ttl = negative_ttl
+        self.revoked_ttl = revoked_ttl
+        self._data = OrderedDict()  # token -> (過期時間 monotonic, CachedSession 或 None)
+        self._revoked = OrderedDict()  # token -> 墓碑過期時間 monotonic (依失效先後排序)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.invalidations = 0
+        self.stale_sets = 0
+        # 失效時的通知 (由 RevocationBroadcaster 設定，轉送給其他 worker)
+        self.on_invalidate = None
+
+    def get(self, token: str):
+        """
+        回傳 (是否命中, 快取值)；快取值為 None 代表已知無效的 Token
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(token)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[token]
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(token)
+            if entry[1] is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return True, entry[1]
+
+    def set(self, token: str, row):
+        """
+        存入查詢結果 (row 為 None 時存成負向快取)
+        """
+        if row is None:
+            ttl = self.negative_ttl
+            value = None
+        else:
+            value = CachedSession(row.user_id, row.username, row.created_at)
+            age = (datetime.now(timezone.utc) - row.created_at).total_seconds()
+            ttl = min(self.max_ttl, self.expire_sec - age)
+            if ttl <= 0:
+                return
+        now = time.monotonic()
+        with self._lock:
+            if value is not None and self._revoked.get(token, 0) > now:
+                # 查詢期間 Token 已被撤銷：不寫入正向結果
+                self.stale_sets += 1
+                return
+            self._data[token] = (now + ttl, value)
+            self._data.move_to_end(token)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, token: str, broadcast: bool = True):
+        """
+        移除 Token；broadcast=False 只清除本 worker (收到其他 worker 的通知、或 Token 已自然過期時)
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._data.pop(token, None) is not None:
+                self.invalidations += 1
+            self._revoked.pop(token, None)
+            self._revoked[token] = now + self.revoked_ttl
+            # 清掉已過期的墓碑 (依失效先後排序，最舊的在前)，數量也不超過 maxsize
+            while self._revoked:
+                oldest = next(iter(self._revoked.values()))
+                if oldest > now and len(self._revoked) <= self.maxsize:
+                    break
+                self._revoked.popitem(last=False)
+        if broadcast and self.on_invalidate is not None:
+            self.on_invalidate(token)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._revoked.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._data)
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "size": size,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "stale_sets": self.stale_sets,
+            "hit_ratio": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0
+        }
+
+class RevocationBroadcaster:
+    """
+    透過 Broker (與聊天室相同的 LISTEN/NOTIFY 機制) 把 Session 失效廣播給所有 worker，
+    登出或重新登入後，舊 Token 在其他 worker 的快取也立即失效，不必等 max_ttl
+    invalidate() 可能在 run_sync 或其他執行緒中被呼叫，所以先排回事件迴圈再發佈
+    """
+    def __init__(self, cache: SessionCache, broker, room: str = "sessions"):
+        self.cache = cache
+        self.broker = broker
+        self.room = room
+        self._loop = None
+        self._tasks = set()
+        self.published = 0
+        self.received = 0
+        self.failures = 0
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        await self.broker.start(self._on_message)
+        self.cache.on_invalidate = self.publish
+
+    def publish(self, token: str):
+        if self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._spawn, token)
+
+    def _spawn(self, token: str):
+        task = asyncio.create_task(self._send(token))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, token: str):
+        try:
+            await self.broker.publish(self.room, {"token": token})
+            self.published += 1
+        except Exception as e:
+            self.failures += 1
+            print(f"Session revocation broadcast failed: {e}")
+
+    def _on_message(self, room: str, message: dict):
+        self.received += 1
+        self.cache.invalidate(message["token"], broadcast=False)
+
+    async def close(self):
+        self.cache.on_invalidate = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._loop = None
+        await self.broker.close()
+
+    def stats(self) -> dict:
+        return {"published": self.published, "received": self.received, "failures": self.failures}
@@ -1,12 +1,349 @@
-import requests
+import argparse
+import asyncio
+import hashlib
+import html
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urljoin, urlsplit
+
+import httpx
 from bs4 import BeautifulSoup
 
-url1 = "https://www.ptt.cc/bbs/index.html"
-url2 = "https://www.dcard.tw/f"
+import databaseOperate
+
+# PTT 看板爬蟲 → 論壇文章的匯入管線：
+# 看板索引頁 (往前翻頁) → 文章網址佇列 → 多個 worker 抓取並解析文章 → 批次寫入 posts
+# 每個階段以有上限的 asyncio.Queue 串接，下游變慢時上游自然等待，不會把整個看板讀進記憶體
+PTT_BASE_URL = os.getenv("PTT_BASE_URL", "https://www.ptt.cc")
+CRAWLER_USERNAME = os.getenv("CRAWLER_USERNAME", "crawler")
 headers = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/90.0.4430.93 Safari/537.36"
 }
+# PTT 文章時間為台北時間
+PTT_TZ = timezone(timedelta(hours=8))
+_SIGNATURE_RE = re.compile(r"\n--\n※ 發信站.*", re.S)
+
+def source_hash(url: str) -> bytes:
+    """
+    來源網址的雜湊，對應 posts.source_url_hash 的唯一索引
+    """
+    return hashlib.blake2b(url.encode("utf-8"), digest_size=16).digest()
+
+@dataclass(slots=True)
+class CrawledPost:
+    title: str
+    content: str
+    created_at: datetime
+    tags: list
+    source_url: str
+    source_hash: bytes = field(init=False)
+
+    def __post_init__(self):
+        self.source_hash = source_hash(self.source_url)
+
+def parse_index(text: str, page_url: str) -> tuple:
+    """
+    解析看板索引頁，回傳 ([(文章網址, 標題), ...], 上一頁網址)；已刪除的文章沒有連結，直接略過
+    """
+    soup = BeautifulSoup(text, "html.parser")
+    entries = []
+    for entry in soup.select("div.r-ent"):
+        link = entry.select_one("div.title a")
+        if link is None or not link.get("href"):
+            continue
+        entries.append((urljoin(page_url, link["href"]), link.get_text(strip=True)))
+    prev_url = None
+    for link in soup.select("div.btn-group-paging a"):
+        if "上頁" in link.get_text() and link.get("href"):
+            prev_url = urljoin(page_url, link["href"])
+    return entries, prev_url
+
+def parse_article(text: str, url: str, fallback_title: str, board: str):
+    """
+    解析文章頁為 CrawledPost；內文去掉推文與簽名檔後轉成論壇使用的 HTML
+    """
+    soup = BeautifulSoup(text, "html.parser")
+    main = soup.select_one("#main-content")
+    if main is None:
+        return None
+
+    meta = {}
+    for line in main.select(".article-metaline, .article-metaline-right"):
+        tag = line.select_one(".article-meta-tag")
+        value = line.select_one(".article-meta-value")
+        if tag and value:
+            meta[tag.get_text(strip=True)] = value.get_text(strip=True)
+        line.decompose()
+    for push in main.select(".push"):
+        push.decompose()
+    body = _SIGNATURE_RE.sub("", main.get_text()).strip()
+
+    created_at = datetime.now(timezone.utc)
+    if meta.get("時間"):
+        try:
+            created_at = datetime.strptime(" ".join(meta["時間"].split()), "%a %b %d %H:%M:%S %Y").replace(tzinfo=PTT_TZ)
+        except ValueError:
+            pass
+
+    paragraphs = "".join(f"<p>{html.escape(line)}</p>" for line in body.split("\n") if line.strip())
+    source = f'<p>來源：<a href="{html.escape(url)}">{html.escape(url)}</a></p>'
+    return CrawledPost(
+        title=(meta.get("標題") or fallback_title)[:255],
+        content=paragraphs + source,
+        created_at=created_at,
+        tags=["ptt", board],
+        source_url=url
+    )
+
+class Fetcher:
+    """
+    非同步 HTTP 抓取：每個主機同時最多 per_host 個請求
+    記住每個網址的 ETag / Last-Modified，下次帶條件式 GET，內容沒變 (304) 時回傳 None
+    """
+    def __init__(self, per_host: int = 4, timeout: float = 10, validators: dict = None):
+        self.per_host = per_host
+        self.validators = validators if validators is not None else {}
+        self._client = httpx.AsyncClient(
+            headers=headers,
+            cookies={"over18": "1"},
+            timeout=timeout,
+            follow_redirects=True
+        )
+        self._host_limits = {}
+        self.pages = 0
+        self.not_modified = 0
+        self.errors = 0
+
+    async def get(self, url: str):
+        conditional = {}
+        cached = self.validators.get(url) or {}
+        if cached.get("etag"):
+            conditional["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            conditional["If-Modified-Since"] = cached["last_modified"]
+
+        host = urlsplit(url).netloc
+        limit = self._host_limits.setdefault(host, asyncio.Semaphore(self.per_host))
+        async with limit:
+            response = await self._client.get(url, headers=conditional)
+        self.pages += 1
+        if response.status_code == 304:
+            self.not_modified += 1
+            return None
+        response.raise_for_status()
+
+        entry = {k: v for k, v in (("etag", response.headers.get("etag")),
+                                   ("last_modified", response.headers.get("last-modified"))) if v}
+        if entry:
+            # 保留上次記錄的上一頁連結 (索引頁)，304 時仍可繼續往前翻
+            if cached.get("prev"):
+                entry["prev"] = cached["prev"]
+            self.validators[url] = entry
+        return response.text
+
+    async def close(self):
+        await self._client.aclose()
+
+class IngestPipeline:
+    """
+    從看板最新的索引頁往前爬 pages 頁，文章以 batch_size 筆為一批寫入 board_id 看板
+    dry_run 時只抓取與解析，不連資料庫 (可搭配 --base-url 指向本機伺服器上的 HTML 檔離線測試)
+    """
+    def __init__(self, fetcher: Fetcher, board: str, pages: int, board_id: int, user_id=None,
+                 workers: int = 8, batch_size: int = 200, dry_run: bool = False, base_url: str = PTT_BASE_URL):
+        self.fetcher = fetcher
+        self.board = board
+        self.pages = pages
+        self.board_id = board_id
+        self.user_id = user_id
+        self.workers = workers
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.base_url = base_url.rstrip("/")
+        self._seen = set()
+        self.articles = 0
+        self.skipped = 0
+        self.parsed = 0
+        self.inserted = 0
+        self.batches = 0
+
+    async def _known_hashes(self, hashes: list) -> set:
+        if self.dry_run:
+            return set()
+        async with databaseOperate.open_async_db() as db:
+            return await db.run_sync(databaseOperate.get_existing_source_hashes, hashes)
+
+    async def _crawl_index(self, articles: asyncio.Queue):
+        url = f"{self.base_url}/bbs/{self.board}/index.html"
+        for _ in range(self.pages):
+            if not url:
+                break
+            try:
+                text = await self.fetcher.get(url)
+            except httpx.HTTPError as e:
+                self.fetcher.errors += 1
+                print(f"Index fetch error {url}: {e}")
+                break
+            if text is None:
+                # 索引頁沒有變動，裡面的文章上次已經處理過
+                url = (self.fetcher.validators.get(url) or {}).get("prev")
+                continue
+            entries, prev_url = await asyncio.to_thread(parse_index, text, url)
+            if url in self.fetcher.validators:
+                self.fetcher.validators[url]["prev"] = prev_url
+
+            fresh = [(link, title, source_hash(link)) for link, title in entries]
+            fresh = [item for item in fresh if item[2] not in self._seen]
+            known = await self._known_hashes([item[2] for item in fresh])
+            for link, title, digest in fresh:
+                self._seen.add(digest)
+                if digest in known:
+                    self.skipped += 1
+                    continue
+                await articles.put((link, title))
+            url = prev_url
+
+    async def _article_worker(self, articles: asyncio.Queue, rows: asyncio.Queue):
+        while True:
+            item = await articles.get()
+            if item is None:
+                return
+            link, title = item
+            try:
+                text = await self.fetcher.get(link)
+            except httpx.HTTPError as e:
+                self.fetcher.errors += 1
+                print(f"Article fetch error {link}: {e}")
+                continue
+            self.articles += 1
+            if text is None:
+                continue
+            post = await asyncio.to_thread(parse_article, text, link, title, self.board)
+            if post is not None:
+                self.parsed += 1
+                await rows.put(post)
+
+    async def _write(self, batch: list):
+        self.batches += 1
+        if self.dry_run:
+            return
+        async with databaseOperate.open_async_db() as db:
+            self.inserted += await db.run_sync(
+                databaseOperate.insert_crawled_posts, batch, self.user_id, self.board_id
+            )
+
+    async def _writer(self, rows: asyncio.Queue):
+        batch = []
+        while True:
+            try:
+                post = await asyncio.wait_for(rows.get(), timeout=1.0)
+            except asyncio.TimeoutError:
+                # 抓取較慢時不必等滿一批才寫入
+                if batch:
+                    await self._write(batch)
+                    batch = []
+                continue
+            if post is None:
+                break
+            batch.append(post)
+            if len(batch) >= self.batch_size:
+                await self._write(batch)
+                batch = []
+        if batch:
+            await self._write(batch)
+
+    async def _produce(self, articles: asyncio.Queue, rows: asyncio.Queue, workers: list):
+        await self._crawl_index(articles)
+        for _ in workers:
+            await articles.put(None)
+        await asyncio.gather(*workers)
+        await rows.put(None)
+
+    async def run(self) -> dict:
+        start = time.perf_counter()
+        articles = asyncio.Queue(maxsize=self.workers * 4)
+        rows = asyncio.Queue(maxsize=self.batch_size * 2)
+        writer = asyncio.create_task(self._writer(rows))
+        workers = [asyncio.create_task(self._article_worker(articles, rows)) for _ in range(self.workers)]
+        producer = asyncio.create_task(self._produce(articles, rows, workers))
+        tasks = [producer, writer] + workers
+        try:
+            # 同時監看寫入端：寫入失敗時沒有人再讀 rows，上游會永遠卡在 put()，所以一出錯就中止整條管線
+            done, _ = await asyncio.wait({producer, writer}, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+            await producer
+            await writer
+        finally:
+            # 取消剛好落在 httpx 關閉連線的 shielded 區段時，CancelledError 可能被吞掉，
+            # worker 會回到 articles.get() 繼續等，所以重複取消直到所有工作真的結束
+            pending = tasks
+            while pending:
+                for task in pending:
+                    task.cancel()
+                _, pending = await asyncio.wait(pending, timeout=1.0)
+        elapsed = time.perf_counter() - start
+        return {
+            "elapsed_sec": round(elapsed, 3),
+            "pages": self.fetcher.pages,
+            "not_modified": self.fetcher.not_modified,
+            "errors": self.fetcher.errors,
+            "articles": self.articles,
+            "skipped_known": self.skipped,
+            "parsed": self.parsed,
+            "inserted": self.inserted,
+            "batches": self.batches,
+            "pages_per_sec": round(self.fetcher.pages / elapsed, 1) if elapsed else 0.0,
+            "rows_per_sec": round((self.parsed if self.dry_run else self.inserted) / elapsed, 1) if elapsed else 0.0
+        }
+
+async def main(args):
+    validators = {}
+    if args.state and os.path.exists(args.state):
+        with open(args.state, encoding="utf-8") as f:
+            validators = json.load(f)
+
+    user_id = None
+    if not args.dry_run:
+        databaseOperate.init_engines()
+        async with databaseOperate.open_async_db() as db:
+            user = await db.run_sync(databaseOperate.get_user_by_username, args.username)
+        if user is None:
+            raise SystemExit(f"crawler user '{args.username}' not found, please register it first")
+        user_id = user.user_id
+
+    fetcher = Fetcher(per_host=args.per_host, validators=validators)
+    pipeline = IngestPipeline(
+        fetcher, args.board, args.pages, args.board_id, user_id,
+        workers=args.workers, batch_size=args.batch, dry_run=args.dry_run, base_url=args.base_url
+    )
+    try:
+        report = await pipeline.run()
+    finally:
+        await fetcher.close()
+        if not args.dry_run:
+            await databaseOperate.dispose_engines()
+
+    if args.state:
+        with open(args.state, "w", encoding="utf-8") as f:
+            json.dump(fetcher.validators, f)
+    for key, value in report.items():
+        print(f"{key}: {value}")
 
-# ptt
-response1 = requests.get(url1, headers=headers)
-soup1 = BeautifulSoup(response1.text, "html.parser")
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="爬取 PTT 看板並批次匯入論壇文章")
+    parser.add_argument("board", help="PTT 看板名稱，例如 Gossiping")
+    parser.add_argument("--board-id", type=int, required=True, help="寫入的論壇看板 id")
+    parser.add_argument("--pages", type=int, default=5, help="由最新往前爬的索引頁數")
+    parser.add_argument("--workers", type=int, default=8, help="同時抓取文章的 worker 數")
+    parser.add_argument("--per-host", type=int, default=4, help="每個主機的同時連線上限")
+    parser.add_argument("--batch", type=int, default=200, help="每批寫入的文章數")
+    parser.add_argument("--username", default=CRAWLER_USERNAME, help="作為作者的論壇帳號")
+    parser.add_argument("--state", help="儲存 ETag / Last-Modified 的 JSON 檔，下次執行時帶條件式 GET")
+    parser.add_argument("--base-url", default=PTT_BASE_URL, help="來源網站，離線測試時可指向本機伺服器")
+    parser.add_argument("--dry-run", action="store_true", help="只抓取與解析，不寫入資料庫")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,190 @@
+import argparse
+import asyncio
+import gzip
+import hashlib
+import mimetypes
+import os
+import shutil
+import tempfile
+import time
+
+from fastapi.responses import FileResponse, Response
+
+from responseCache import etag_matches
+
+# Vite 打包後 /assets 底下的檔名含內容雜湊，內容變了檔名就會變，可以放心長期快取
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+# 沒有預先壓縮檔時，啟動時在記憶體中 gzip 的檔案類型與大小範圍
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_MAX_SIZE = 5 * 1024 * 1024
+
+mimetypes.add_type("text/javascript", ".js")
+mimetypes.add_type("image/svg+xml", ".svg")
+
+class StaticAsset:
+    """
+    一個靜態檔與它的壓縮版本
+    variants: 編碼 -> (檔案路徑或 None, 記憶體內容或 None, ETag)
+    """
+    def __init__(self, path: str, content_type: str, cache_control: str, etag: str):
+        self.path = path
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.etag = etag
+        self.body = None
+        self.variants = {}
+
+class StaticSite:
+    """
+    啟動時掃描 dist/ 建立檔案索引，之後每個請求只查字典，不再呼叫 os.path.exists / isfile
+    - 依 Accept-Encoding 回傳預先壓縮的 .br / .gz (沒有 .gz 時於啟動時產生)
+    - index.html 放在記憶體中並附 ETag
+    """
+    def __init__(self, dist_dir: str):
+        self.dist_dir = dist_dir
+        self.assets = {}
+        self.index = None
+
+    def load(self):
+        self.assets = {}
+        self.index = None
+        if not os.path.isdir(self.dist_dir):
+            return
+        for root, _, files in os.walk(self.dist_dir):
+            for name in files:
+                if name.endswith((".br", ".gz")):
+                    continue
+                full_path = os.path.join(root, name)
+                url = "/" + os.path.relpath(full_path, self.dist_dir).replace(os.sep, "/")
+                self.assets[url] = self._build(full_path, url)
+        self.index = self.assets.get("/index.html")
+        if self.index is not None:
+            with open(self.index.path, "rb") as f:
+                self.index.body = f.read()
+
+    def _build(self, full_path: str, url: str) -> StaticAsset:
+        with open(full_path, "rb") as f:
+            data = f.read()
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        content_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+        cache_control = IMMUTABLE_CACHE if url.startswith("/assets/") else REVALIDATE_CACHE
+        asset = StaticAsset(full_path, content_type, cache_control, f'"{digest}"')
+
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if os.path.isfile(full_path + suffix):
+                asset.variants[encoding] = (full_path + suffix, None, f'"{digest}-{suffix[1:]}"')
+        if ("gzip" not in asset.variants
+                and content_type.startswith(COMPRESSIBLE_TYPES)
+                and COMPRESS_MIN_SIZE <= len(data) <= COMPRESS_MAX_SIZE):
+            asset.variants["gzip"] = (None, gzip.compress(data, compresslevel=9), f'"{digest}-gz"')
+        return asset
+
+    def lookup(self, url: str):
+        return self.assets.get(url)
+
+    def respond(self, request, asset: StaticAsset) -> Response:
+        accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+        path, body, etag, encoding = asset.path, asset.body, asset.etag, None
+        for candidate in ("br", "gzip"):
+            if candidate in accepted and candidate in asset.variants:
+                path, body, etag = asset.variants[candidate]
+                encoding = candidate
+                break
+
+        headers = {"Cache-Control": asset.cache_control, "ETag": etag}
+        if asset.variants:
+            headers["Vary"] = "Accept-Encoding"
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        if body is not None:
+            return Response(content=body, media_type=asset.content_type, headers=headers)
+        return FileResponse(path, media_type=asset.content_type, headers=headers)
+
+    def stats(self) -> dict:
+        return {
+            "files": len(self.assets),
+            "compressed_variants": sum(len(a.variants) for a in self.assets.values())
+        }
+
+def _accepted_encodings(header: str) -> set:
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        if name:
+            accepted.add(name.strip().lower())
+    return accepted
+
+if __name__ == "__main__":
+    import httpx
+    from fastapi import FastAPI, Request
+    from fastapi.staticfiles import StaticFiles
+
+    parser = argparse.ArgumentParser(description="比較 SPA 首頁與雜湊靜態檔的每秒請求數：每次查檔 + FileResponse (舊) 與 StaticSite (新)")
+    parser.add_argument("--requests", type=int, default=2000, help="每種情境的請求數")
+    parser.add_argument("--asset-size", type=int, default=200 * 1024, help="JS 檔大小 (bytes)")
+    args = parser.parse_args()
+
+    dist = tempfile.mkdtemp(prefix="dist-")
+    os.makedirs(os.path.join(dist, "assets"))
+    with open(os.path.join(dist, "index.html"), "w") as f:
+        f.write('<!doctype html><html><head><script type="module" src="/assets/index-3f2a9c.js"></script></head>'
+                '<body><div id="root"></div></body></html>' + "<!-- padding -->" * 100)
+    with open(os.path.join(dist, "assets", "index-3f2a9c.js"), "w") as f:
+        # 每行內容不同，壓縮率才接近實際打包後的 JS
+        source = "".join(f"export function r{i}(n){{return n*{i * 7919 % 10007}+'{hashlib.md5(str(i).encode()).hexdigest()}'}}\n"
+                         for i in range(args.asset_size // 60 + 1))
+        f.write(source[:args.asset_size])
+
+    # 原本的寫法：/assets 掛 StaticFiles，其餘路徑每次以 os.path 檢查檔案後回傳 FileResponse (不壓縮、沒有 ETag 快取策略)
+    before = FastAPI()
+    before.mount("/assets", StaticFiles(directory=os.path.join(dist, "assets")), name="assets")
+
+    @before.get("/{catchall:path}")
+    async def serve_before(request: Request, catchall: str):
+        requested_file = os.path.join(dist, catchall)
+        if os.path.exists(requested_file) and os.path.isfile(requested_file):
+            return FileResponse(requested_file)
+        return FileResponse(os.path.join(dist, "index.html"))
+
+    site = StaticSite(dist)
+    site.load()
+    after = FastAPI()
+
+    @after.get("/{catchall:path}")
+    async def serve_after(request: Request, catchall: str):
+        asset = site.lookup("/" + catchall)
+        return site.respond(request, asset if asset is not None else site.index)
+
+    async def measure(app, url, headers):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            response = await client.get(url, headers=headers)
+            etag = response.headers.get("etag")
+            start = time.perf_counter()
+            for _ in range(args.requests):
+                response = await client.get(url, headers=headers)
+            elapsed = time.perf_counter() - start
+            wire = len(response.content) if response.status_code == 304 else int(response.headers.get("content-length", 0))
+            return args.requests / elapsed, response.status_code, wire, etag
+
+    async def main():
+        accept = {"Accept-Encoding": "gzip, br"}
+        print(f"{args.requests} sequential requests per case, in-process ASGI, JS asset {args.asset_size // 1024} KiB")
+        for name, url in (("SPA shell /posts/42", "/posts/42"), ("hashed asset", "/assets/index-3f2a9c.js")):
+            old_rps, old_status, old_size, _ = await measure(before, url, accept)
+            new_rps, new_status, new_size, etag = await measure(after, url, accept)
+            print(f"{name:22s} before {old_rps:7.0f} req/s ({old_status}, {old_size} B)  "
+                  f"after {new_rps:7.0f} req/s ({new_status}, {new_size} B)  x{new_rps / old_rps:.1f}")
+            # 瀏覽器帶 If-None-Match 重新驗證時，新版回 304 不傳內容
+            cached_rps, status, _, _ = await measure(after, url, {**accept, "If-None-Match": etag})
+            print(f"{'  revalidated':22s} after {cached_rps:7.0f} req/s ({status})")
+
+    try:
+        asyncio.run(main())
+    finally:
+        shutil.rmtree(dist)
@@ -0,0 +1,90 @@
+import os
+import sys
+from contextlib import asynccontextmanager
+
+import pytest
+
+# 後端模組以扁平方式互相 import (例如 import databaseOperate)，測試時把 backend/ 加入搜尋路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatHub import Broker
+
+class SharedBroker:
+    """
+    模擬多個 worker 共用的 LISTEN/NOTIFY：每個 worker 各自 attach 一個 Broker，發佈時送給全部
+    """
+    def __init__(self):
+        self.handlers = []
+
+    def attach(self) -> Broker:
+        shared = self
+
+        class WorkerBroker(Broker):
+            async def start(self, handler):
+                shared.handlers.append(handler)
+
+            async def publish(self, room, message):
+                for handler in shared.handlers:
+                    handler(room, message)
+        return WorkerBroker()
+
+@pytest.fixture
+def shared_broker():
+    return SharedBroker()
+
+class StubDB:
+    """
+    代替 AsyncSession：不連資料庫，記錄取用的 Session 數與 run_sync 執行的查詢 (函式, 參數)
+    results 以查詢函式為 key 指定回傳值 (可呼叫的值以查詢參數呼叫後回傳)，其他查詢回傳 None
+    """
+    def __init__(self, results=None):
+        self.results = dict(results or {})
+        self.sessions = 0
+        self.calls = []
+
+    async def dependency(self):
+        self.sessions += 1
+        yield self
+
+    @asynccontextmanager
+    async def open(self, read_only=False):
+        self.sessions += 1
+        yield self
+
+    async def run_sync(self, func, *args, **kwargs):
+        self.calls.append((func, args))
+        result = self.results.get(func)
+        return result(*args) if callable(result) else result
+
+    def queries(self, func=None) -> list:
+        """
+        依序回傳執行過的查詢名稱；指定 func 時回傳該查詢每次的參數
+        """
+        if func is None:
+            return [called.__name__ for called, _ in self.calls]
+        return [args for called, args in self.calls if called is func]
+
+@pytest.fixture
+def stub_db(monkeypatch):
+    """
+    讓 main.app 的讀寫 Session 與 open_async_db 都改用 StubDB，限流計數也重新開始
+    """
+    import databaseOperate
+    import main
+    import rateLimiter
+
+    db = StubDB()
+    monkeypatch.setattr(databaseOperate, "open_async_db", db.open)
+    monkeypatch.setattr(main, "rate_limiter", rateLimiter.RateLimiter(rateLimiter.MemoryBackend()))
+    main.app.dependency_overrides[databaseOperate.get_async_db] = db.dependency
+    main.app.dependency_overrides[databaseOperate.get_async_read_db] = db.dependency
+    yield db
+    main.app.dependency_overrides.clear()
+
+@pytest.fixture
+def client(stub_db):
+    from fastapi.testclient import TestClient
+
+    import main
+
+    return TestClient(main.app)
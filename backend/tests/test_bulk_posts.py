@@ -0,0 +1,99 @@
+import asyncio
+import threading
+
+import pytest
+
+import bulkPosts
+import main
+
+def test_stage_line_escapes_copy_fields():
+    line = bulkPosts.to_stage_line({
+        "title": "貓\t標題", "content": "<p>一隻貓\n在睡覺</p>", "username": "alice",
+        "board_id": "3", "tags": '["cat"]', "created_at": "2024-03-05T10:20:30+08:00"
+    })
+    fields = line.rstrip("\n").split("\t")
+    assert len(fields) == 10
+    assert fields[0] == "貓\\t標題"
+    assert fields[3] == "3"
+    # content_length 是純文字長度 (不含標籤)，與摘要比較才能判斷是否被截斷
+    assert fields[6] == "一隻貓 在睡覺"
+    assert fields[7] == "7"
+    assert "睡覺" in fields[9]
+
+@pytest.mark.parametrize("record", [
+    {"title": 123, "content": "<p>x</p>", "username": "alice"},
+    {"title": "t", "content": {"html": "<p>x</p>"}, "username": "alice"},
+    {"title": "t", "content": "<p>x</p>", "username": ["alice"]},
+    {"title": "t", "content": "<p>x</p>", "username": "alice", "tags": "not json"},
+    {"title": "t", "content": "<p>x</p>", "username": "alice", "created_at": "yesterday"},
+])
+def test_malformed_records_are_skipped(record):
+    assert bulkPosts.to_stage_line(record) is None
+
+def test_cancelled_export_releases_reader_thread(monkeypatch):
+    release = threading.Event()
+
+    def stalled_export(out, fmt, board_id=None):
+        # 寫出第一塊後卡住 (例如 COPY 在等鎖)，之後不再寫入
+        out.write(b'{"id": 1}\n')
+        release.wait(5)
+
+    monkeypatch.setattr(bulkPosts, "export_posts", stalled_export)
+
+    async def scenario():
+        chunks = bulkPosts.stream_export("ndjson")
+        assert await chunks.__anext__() == b'{"id": 1}\n'
+        pending = asyncio.ensure_future(chunks.__anext__())
+        await asyncio.sleep(0.2)
+        # 客戶端斷線：StreamingResponse 取消正在等下一塊資料的工作
+        pending.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await pending
+        # COPY 的 task 已被取消並等待完成，不會留在事件迴圈裡
+        leftover = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        release.set()
+        assert leftover == []
+
+    finished = threading.Event()
+
+    def run():
+        # asyncio.run 結束時會等待預設執行緒池，讀取執行緒卡住的話就不會返回
+        asyncio.run(scenario())
+        finished.set()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(10)
+    assert finished.is_set()
+
+@pytest.fixture
+def admin_client(client, monkeypatch):
+    uploads = []
+
+    def import_posts(path, fmt, job, source=None):
+        with open(path, "rb") as upload:
+            uploads.append(upload.read())
+        return {"imported": 1}
+
+    monkeypatch.setattr(bulkPosts, "import_posts", import_posts)
+    monkeypatch.setattr(main, "IMPORT_MAX_UPLOAD_BYTES", 16)
+    main.app.dependency_overrides[main.get_admin_user] = lambda: {"name": "admin"}
+    return client, uploads
+
+def test_import_writes_the_whole_upload(admin_client):
+    client, uploads = admin_client
+    body = b'{"title": "t"}\n'
+    response = client.post("/api/admin/posts/import", params={"job": "j"}, content=body)
+    assert response.status_code == 200
+    assert uploads == [body]
+
+@pytest.mark.parametrize("content", [
+    b"x" * 17,
+    # chunked 上傳沒有 Content-Length，以實際收到的大小判斷
+    iter([b"x" * 10, b"x" * 10]),
+])
+def test_import_rejects_oversized_upload(admin_client, content):
+    client, uploads = admin_client
+    response = client.post("/api/admin/posts/import", params={"job": "j"}, content=content)
+    assert response.status_code == 413
+    assert uploads == []
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+asyncpg = pytest.importorskip("asyncpg")
+
+import chatHub
+
+class FakeConnection:
+    """
+    代替 asyncpg 連線：pg_notify 直接回呼同一 channel 的 listener，可以模擬連線被伺服器切斷
+    """
+    def __init__(self, server):
+        self.server = server
+        self.closed = False
+        self.listeners = {}
+        self.termination_listeners = []
+
+    async def add_listener(self, channel, callback):
+        self.listeners[channel] = callback
+
+    def add_termination_listener(self, callback):
+        self.termination_listeners.append(callback)
+
+    async def execute(self, query, channel, payload):
+        if self.closed:
+            raise asyncpg.exceptions.ConnectionDoesNotExistError("connection was closed")
+        for conn in self.server.connections:
+            if not conn.closed and channel in conn.listeners:
+                conn.listeners[channel](conn, 0, channel, payload)
+
+    def is_closed(self):
+        return self.closed
+
+    def terminate(self):
+        self.drop()
+
+    async def close(self):
+        self.closed = True
+
+    def drop(self):
+        self.closed = True
+        for callback in self.termination_listeners:
+            callback(self)
+
+class FakeServer:
+    def __init__(self, down=0):
+        self.down = down  # 接下來幾次連線會失敗
+        self.connections = []
+
+    async def connect(self, dsn):
+        if self.down:
+            self.down -= 1
+            raise OSError("connection refused")
+        conn = FakeConnection(self)
+        self.connections.append(conn)
+        return conn
+
+async def _until(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.005)
+
+def _broker(server, monkeypatch):
+    monkeypatch.setattr(asyncpg, "connect", server.connect)
+    return chatHub.PostgresBroker("postgresql://test", "forum_chat", backoff_base=0.01, backoff_max=0.05)
+
+def test_broker_reconnects_after_connection_loss(monkeypatch):
+    async def scenario():
+        server = FakeServer()
+        broker = _broker(server, monkeypatch)
+        received = []
+        await broker.start(lambda room, message: received.append((room, message)))
+        await broker.publish("r", {"n": 1})
+
+        server.down = 2
+        server.connections[0].drop()
+        with pytest.raises(chatHub.BrokerUnavailable):
+            await broker.publish("r", {"n": 2})
+        await _until(lambda: broker.reconnects == 1)
+
+        await broker.publish("r", {"n": 3})
+        await broker.close()
+        return received, broker
+
+    received, broker = asyncio.run(scenario())
+    assert received == [("r", {"n": 1}), ("r", {"n": 3})]
+    assert broker.publish_failures == 1
+
+def test_broker_start_survives_database_down(monkeypatch):
+    async def scenario():
+        server = FakeServer(down=3)
+        broker = _broker(server, monkeypatch)
+        received = []
+        await broker.start(lambda room, message: received.append(message))
+        with pytest.raises(chatHub.BrokerUnavailable):
+            await broker.publish("r", {"n": 1})
+        await _until(lambda: broker.reconnects == 1)
+        await broker.publish("r", {"n": 2})
+        await broker.close()
+        return received
+
+    assert asyncio.run(scenario()) == [{"n": 2}]
+
+def test_closed_broker_does_not_reconnect(monkeypatch):
+    async def scenario():
+        server = FakeServer()
+        broker = _broker(server, monkeypatch)
+        await broker.start(lambda room, message: None)
+        await broker.close()
+        await asyncio.sleep(0.05)
+        return server
+
+    assert len(asyncio.run(scenario()).connections) == 1
@@ -0,0 +1,36 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi import WebSocketDisconnect
+
+import chatHub
+import databaseOperate
+import main
+
+@pytest.fixture
+def chat_client(stub_db, client, monkeypatch):
+    hub = chatHub.ChatHub(chatHub.InMemoryBroker())
+    asyncio.run(hub.start())
+    monkeypatch.setattr(main, "chat_hub", hub)
+    stub_db.results[databaseOperate.get_user_by_session_cached] = SimpleNamespace(
+        user_id="u1", username="alice", created_at=datetime.now(timezone.utc)
+    )
+    client.cookies.set("auth_token", "token")
+    return client
+
+def test_foreign_origin_is_rejected(chat_client):
+    with pytest.raises(WebSocketDisconnect) as exc_info:
+        with chat_client.websocket_connect("/api/ws/boards/1", headers={"Origin": "https://evil.example"}):
+            pass
+    assert exc_info.value.code == 1008
+
+def test_messages_beyond_the_connection_limit_are_dropped(chat_client):
+    limit = main.RATE_RULES["chat_message"].limit
+    with chat_client.websocket_connect("/api/ws/boards/1", headers={"Origin": main.ALLOWED_ORIGINS[0]}) as ws:
+        for i in range(limit):
+            ws.send_json({"text": f"喵 {i}"})
+            assert ws.receive_json()["type"] == "message"
+        ws.send_json({"text": "再一則"})
+        assert ws.receive_json()["type"] == "error"
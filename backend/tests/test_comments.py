@@ -0,0 +1,22 @@
+import pytest
+
+import databaseOperate
+
+@pytest.fixture(autouse=True)
+def no_comments(stub_db):
+    stub_db.results[databaseOperate.get_comments] = ([], None)
+
+@pytest.mark.parametrize("limit", [0, -1, 201])
+def test_comments_reject_out_of_range_limit(client, stub_db, limit):
+    assert client.get("/api/posts/1/comments", params={"limit": limit}).status_code == 422
+    assert stub_db.calls == []
+
+def test_comments_pass_limit_through(client, stub_db):
+    response = client.get("/api/posts/1/comments", params={"limit": 200})
+    assert response.status_code == 200
+    assert stub_db.queries(databaseOperate.get_comments) == [(1, None, 200, None)]
+
+def test_comment_path_stays_within_index_row_limit():
+    # btree 索引的資料列上限約 2700 bytes (post_id + path)
+    deepest_path = (databaseOperate.MAX_COMMENT_DEPTH + 1) * (databaseOperate.COMMENT_PATH_WIDTH + 1)
+    assert deepest_path < 2000
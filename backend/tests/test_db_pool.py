@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+pytest.importorskip("aiosqlite")
+
+import databaseOperate
+import dbRouting
+from dbHealth import CircuitBreaker
+
+def test_pool_exhaustion_returns_503_without_tripping_breaker(tmp_path, monkeypatch):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'db.sqlite'}",
+                                 pool_size=1, max_overflow=0, pool_timeout=0.1)
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=5)
+    monkeypatch.setattr(databaseOperate, "db_breaker", breaker)
+    monkeypatch.setattr(databaseOperate, "AsyncSessionLocal", async_sessionmaker(
+        bind=engine, sync_session_class=dbRouting.RoutingSession, expire_on_commit=False
+    ))
+
+    async def scenario():
+        try:
+            # 唯一的連線被佔用時，之後的請求等 pool_timeout 後應得到 503 而不是 500
+            statuses = []
+            async with databaseOperate.open_async_db():
+                for _ in range(breaker.failure_threshold):
+                    with pytest.raises(HTTPException) as exc_info:
+                        async with databaseOperate.open_async_db():
+                            pass
+                    statuses.append(exc_info.value.status_code)
+            # 資料庫本身正常：連線歸還後馬上可以使用，不會被斷路器擋下
+            async with databaseOperate.open_async_db():
+                pass
+            return statuses
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(scenario()) == [503] * breaker.failure_threshold
+    assert breaker.state == "closed"
+    assert breaker.stats()["consecutive_failures"] == 0
+
+class StubSession:
+    async def rollback(self):
+        pass
+
+    async def close(self):
+        pass
+
+def _half_open_breaker(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    monkeypatch.setattr(databaseOperate, "db_breaker", breaker)
+    return breaker
+
+@pytest.mark.parametrize("error", [
+    asyncio.CancelledError(),
+    DBAPIError("SET statement_timeout", {}, Exception("permission denied")),
+])
+def test_interrupted_trial_releases_the_half_open_slot(monkeypatch, error):
+    breaker = _half_open_breaker(monkeypatch)
+
+    async def interrupted(replica=None):
+        raise error
+
+    async def healthy(replica=None):
+        return StubSession()
+
+    async def scenario():
+        # 試探請求在取連線時被取消 (客戶端斷線) 或遇到非連線錯誤：結果不算成功也不算失敗
+        monkeypatch.setattr(databaseOperate, "_checkout", interrupted)
+        with pytest.raises(type(error)):
+            async with databaseOperate.open_async_db():
+                pass
+        # 名額已歸還，下一個請求可以再試探並讓斷路器恢復
+        monkeypatch.setattr(databaseOperate, "_checkout", healthy)
+        async with databaseOperate.open_async_db():
+            pass
+
+    asyncio.run(scenario())
+    assert breaker.state == "closed"
+
+def test_failed_trial_reopens_the_breaker(monkeypatch):
+    breaker = _half_open_breaker(monkeypatch)
+
+    async def refused(replica=None):
+        raise OperationalError("connect", {}, ConnectionRefusedError())
+
+    monkeypatch.setattr(databaseOperate, "_checkout", refused)
+
+    async def scenario():
+        with pytest.raises(HTTPException) as exc_info:
+            async with databaseOperate.open_async_db():
+                pass
+        return exc_info.value.status_code
+
+    assert asyncio.run(scenario()) == 503
+    assert breaker.stats()["consecutive_failures"] == 2
+    assert not breaker._trial_running
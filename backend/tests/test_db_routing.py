@@ -0,0 +1,134 @@
+import asyncio
+import sqlite3
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from starlette.requests import Request
+
+pytest.importorskip("aiosqlite")
+
+import databaseOperate
+import dbRouting
+import main
+import responseCache
+import sessionCache
+from dbHealth import CircuitBreaker
+
+# 以兩個 SQLite 檔案代替主庫與副本：表 t 只有一列，內容標明資料來自哪一邊
+@dbRouting.read_only
+def read_value(db):
+    return db.execute(text("SELECT v FROM t")).scalar()
+
+def write_value(db):
+    return db.execute(text("SELECT v FROM t")).scalar()
+
+def _make_db(path, value):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (v TEXT)")
+    conn.execute("INSERT INTO t VALUES (?)", (value,))
+    conn.commit()
+    conn.close()
+    return create_async_engine(f"sqlite+aiosqlite:///{path}")
+
+@pytest.fixture
+def stand_ins(tmp_path, monkeypatch):
+    primary = _make_db(tmp_path / "primary.db", "primary")
+    replica = _make_db(tmp_path / "replica.db", "replica")
+    replica_set = dbRouting.ReplicaSet(failure_threshold=1, reset_timeout=60)
+    monkeypatch.setattr(databaseOperate, "replica_set", replica_set)
+    monkeypatch.setattr(databaseOperate, "AsyncSessionLocal", async_sessionmaker(
+        bind=primary, sync_session_class=dbRouting.RoutingSession, expire_on_commit=False
+    ))
+    monkeypatch.setattr(databaseOperate, "db_breaker", CircuitBreaker(3, 5))
+    yield replica_set, replica, tmp_path
+
+    async def dispose():
+        await primary.dispose()
+        for r in replica_set.replicas:
+            await r.engine.dispose()
+    asyncio.run(dispose())
+
+async def _read(read_only=True, func=read_value):
+    async with databaseOperate.open_async_db(read_only=read_only) as db:
+        return await db.run_sync(func)
+
+def test_read_only_queries_go_to_replica(stand_ins):
+    replica_set, replica, _ = stand_ins
+    replica_set.add("replica0", replica)
+    assert asyncio.run(_read()) == "replica"
+    # 沒有 @read_only 標記的語句仍走主庫
+    assert asyncio.run(_read(func=write_value)) == "primary"
+    # 一般 (寫入用) Session 不使用副本
+    assert asyncio.run(_read(read_only=False)) == "primary"
+    assert replica_set.replicas[0].queries == 1
+
+def test_pinned_client_reads_primary(stand_ins):
+    replica_set, replica, _ = stand_ins
+    replica_set.add("replica0", replica)
+
+    async def pinned_read():
+        token = dbRouting.primary_pinned.set(True)
+        try:
+            return await _read()
+        finally:
+            dbRouting.primary_pinned.reset(token)
+    assert asyncio.run(pinned_read()) == "primary"
+    assert replica_set.replicas[0].sessions == 0
+
+def test_session_lookup_reads_primary(stand_ins, monkeypatch):
+    replica_set, replica, tmp_path = stand_ins
+    replica_set.add("replica0", replica)
+    # 主庫已登出 (沒有 Session)，延遲的副本還留著該 Session
+    for name, sessions in (("primary.db", []), ("replica.db", [("token", "u1")])):
+        conn = sqlite3.connect(tmp_path / name)
+        conn.execute("CREATE TABLE users (user_id TEXT, username TEXT)")
+        conn.execute("CREATE TABLE user_sessions (session_token TEXT, user_id TEXT, created_at TEXT)")
+        conn.execute("INSERT INTO users VALUES ('u1', 'alice')")
+        conn.executemany("INSERT INTO user_sessions VALUES (?, ?, CURRENT_TIMESTAMP)", sessions)
+        conn.commit()
+        conn.close()
+    monkeypatch.setattr(databaseOperate, "session_cache", sessionCache.SessionCache(expire_sec=86400))
+
+    async def lookup():
+        async with databaseOperate.open_async_db(read_only=True) as db:
+            return await db.run_sync(databaseOperate.get_user_by_session_cached, "token")
+
+    assert asyncio.run(lookup()) is None
+    assert replica_set.replicas[0].queries == 0
+
+def test_broken_replica_falls_back_and_is_ejected(stand_ins):
+    replica_set, _, tmp_path = stand_ins
+    bad = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    replica_set.add("broken", bad)
+    assert asyncio.run(_read()) == "primary"
+    # 斷路器開啟後不再嘗試這個副本
+    assert replica_set.choose() is None
+    assert replica_set.fallbacks == 1
+    assert asyncio.run(_read()) == "primary"
+
+def test_pinned_request_bypasses_response_cache(monkeypatch):
+    cache = responseCache.ResponseCache(maxsize=10)
+    monkeypatch.setattr(main, "response_cache", cache)
+    request = Request({"type": "http", "method": "GET", "headers": []})
+    key = ("post", 1)
+
+    async def load_stale():
+        return {"title": "stale"}
+
+    async def load_fresh():
+        return {"title": "fresh"}
+
+    async def scenario():
+        # 其他客戶端先從延遲的副本填入舊內容
+        await main.cached_json_response(request, key, 60, load_stale)
+        token = dbRouting.primary_pinned.set(True)
+        try:
+            return await main.cached_json_response(request, key, 60, load_fresh)
+        finally:
+            dbRouting.primary_pinned.reset(token)
+
+    response = asyncio.run(scenario())
+    assert b"fresh" in response.body
+    # 讀主庫的結果不寫回快取
+    assert b"stale" in cache.get(key).body
@@ -0,0 +1,27 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+import databaseOperate
+import feedRanker
+import main
+
+@pytest.fixture(autouse=True)
+def signed_in(stub_db, client, monkeypatch):
+    monkeypatch.setattr(main, "feed_ranker", feedRanker.FeedRanker())
+    stub_db.results[databaseOperate.get_user_by_session_cached] = SimpleNamespace(
+        user_id="u1", username="alice", created_at=datetime.now(timezone.utc)
+    )
+    stub_db.results[databaseOperate.get_all_posts] = []
+    client.cookies.set("auth_token", "token")
+
+def test_feed_uses_one_session_for_auth_and_loading(client, stub_db):
+    response = client.get("/api/feed")
+    assert response.status_code == 200
+    assert stub_db.sessions == 1
+    assert stub_db.queries() == ["get_user_by_session_cached", "get_all_posts", "get_user_profile"]
+
+@pytest.mark.parametrize("limit", [0, 101])
+def test_feed_rejects_out_of_range_limit(client, limit):
+    assert client.get("/api/feed", params={"limit": limit}).status_code == 422
@@ -0,0 +1,88 @@
+import smtplib
+import socket
+
+import pytest
+
+aiosmtpd_controller = pytest.importorskip("aiosmtpd.controller")
+
+from emailSender import MailQueue, OutboundMail, SMTPConnectionPool, build_verification_message
+
+class RecordingHandler:
+    """
+    本機 SMTP 伺服器：拒收 refused 中的收件者 (550)，其餘記錄下來
+    """
+    def __init__(self, refused=()):
+        self.refused = set(refused)
+        self.delivered = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.refused:
+            return "550 5.1.1 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.delivered.extend(envelope.rcpt_tos)
+        return "250 Message accepted"
+
+@pytest.fixture
+def smtp_server():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    handler = RecordingHandler(refused={"bad@example.com"})
+    controller = aiosmtpd_controller.Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    yield handler, "127.0.0.1", port
+    controller.stop()
+
+@pytest.fixture
+def queue(smtp_server, monkeypatch):
+    _, host, port = smtp_server
+    pool = SMTPConnectionPool(size=1)
+
+    def connect():
+        # 本機測試伺服器不需要 STARTTLS 與登入
+        pool.connects += 1
+        return smtplib.SMTP(host, port, timeout=5)
+    monkeypatch.setattr(pool, "_connect", connect)
+    mail_queue = MailQueue(pool, rate_per_sec=1000)
+    yield mail_queue
+    pool.close()
+
+def _mail(address):
+    return OutboundMail(address, build_verification_message(address, "123456"))
+
+def test_refused_recipient_does_not_abort_the_batch(smtp_server, queue):
+    handler, _, _ = smtp_server
+    batch = [_mail(a) for a in ("a@example.com", "bad@example.com", "c@example.com", "d@example.com")]
+    queue._send_batch(batch)
+
+    assert handler.delivered == ["a@example.com", "c@example.com", "d@example.com"]
+    assert queue.sent == 3
+    # 只有被拒的那封重新排程，連線保留下來重複使用
+    assert queue.retried == 1
+    assert [mail.to_email for _, _, mail in queue._heap] == ["bad@example.com"]
+    assert queue.pool.connects == 1
+
+    queue._send_batch([_mail("e@example.com")])
+    assert handler.delivered[-1] == "e@example.com"
+    assert queue.pool.connects == 1
+
+def test_dropped_connection_requeues_the_rest(smtp_server, queue, monkeypatch):
+    sent = []
+
+    def send_message(message):
+        if len(sent) == 1:
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        sent.append(message["To"])
+
+    server = queue.pool.acquire()
+    monkeypatch.setattr(server, "send_message", send_message)
+    queue.pool.release(server)
+
+    queue._send_batch([_mail(a) for a in ("a@example.com", "c@example.com", "d@example.com")])
+    assert sent == ["a@example.com"]
+    assert queue.retried == 2
+    # 斷線的連線不會放回連線池
+    assert queue.pool._idle == []
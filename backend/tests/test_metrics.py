@@ -0,0 +1,26 @@
+import asyncio
+
+import metrics
+
+async def _not_found(scope, receive, send):
+    await send({"type": "http.response.start", "status": 404, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+def _request(method: str):
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    scope = {"type": "http", "method": method, "path": "/x"}
+    asyncio.run(metrics.MetricsMiddleware(_not_found)(scope, receive, send))
+
+def test_unknown_methods_share_one_label():
+    for i in range(20):
+        _request(f"X{i}")
+    _request("GET")
+    methods = {labels[0] for labels in metrics.HTTP_REQUESTS._values}
+    assert "OTHER" in methods
+    assert "GET" in methods
+    assert not any(method.startswith("X") for method in methods)
@@ -0,0 +1,19 @@
+import asyncio
+
+import password
+from password import PasswordManager
+
+def test_pool_survives_repeated_lifespans(monkeypatch):
+    monkeypatch.setattr(password, "BCRYPT_ROUNDS", 4)
+
+    async def lifespan():
+        PasswordManager.start()
+        try:
+            hashed = await PasswordManager.hash_password_async("secret")
+            return await PasswordManager.verify_password_async("secret", hashed)
+        finally:
+            await asyncio.to_thread(PasswordManager.shutdown)
+
+    # 同一個 process 內第二次 lifespan (例如測試或重新載入) 不能用到已關閉的執行緒池
+    assert asyncio.run(lifespan()) is True
+    assert asyncio.run(lifespan()) is True
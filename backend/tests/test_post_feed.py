@@ -0,0 +1,60 @@
+import asyncio
+import json
+
+from chatHub import InMemoryBroker
+from postFeed import PostFeed, post_event
+
+def _event(post_id, board_id=1):
+    return post_event(post_id, f"文章 {post_id}", board_id, ["貓"], {"name": "alice", "id": "u1"})
+
+def _feed(ring_size=512):
+    async def start():
+        feed = PostFeed(InMemoryBroker(), ring_size=ring_size)
+        await feed.start()
+        return feed
+    return start()
+
+def test_replay_follows_delivery_order_not_post_id():
+    async def scenario():
+        feed = await _feed()
+        # id 來自 sequence：102 先 commit 並送出，101 晚一步才 commit
+        await feed.publish(_event(100))
+        await feed.publish(_event(102))
+        # 客戶端收到 102 後斷線，期間 101 與 103 送達
+        await feed.publish(_event(101))
+        await feed.publish(_event(103))
+        _, replay, gap = feed.subscribe(102)
+        return [event.id for event in replay], gap
+
+    assert asyncio.run(scenario()) == ([101, 103], False)
+
+def test_unknown_last_event_id_asks_for_reset():
+    async def scenario():
+        feed = await _feed(ring_size=2)
+        for post_id in (1, 2, 3):
+            await feed.publish(_event(post_id))
+        # 1 已被擠出重播環
+        return feed.subscribe(1), feed.subscribe(2)
+
+    (_, evicted_replay, evicted_gap), (_, replay, gap) = asyncio.run(scenario())
+    assert (evicted_replay, evicted_gap) == ([], True)
+    assert ([event.id for event in replay], gap) == ([3], False)
+
+def test_event_payload_is_bounded():
+    event = post_event(1, "貓" * 5000, 1, ["標籤" * 100] * 500, {"name": "alice", "id": "u1"})
+    # NOTIFY 的 payload 上限約 8000 bytes (broker 另外包一層 room)
+    assert len(json.dumps({"room": "posts", "message": event}, ensure_ascii=False).encode()) < 4000
+
+def test_close_ends_open_streams():
+    async def scenario():
+        feed = await _feed()
+        queue, _, _ = feed.subscribe()
+        await feed.publish(_event(1))
+        await feed.close()
+        received = [await asyncio.wait_for(queue.get(), 1)]
+        return received, feed.stats()["subscribers"]
+
+    received, subscribers = asyncio.run(scenario())
+    # 已排隊的事件被清掉也沒關係，客戶端重連時會以 Last-Event-ID 補回
+    assert received == [None]
+    assert subscribers == 0
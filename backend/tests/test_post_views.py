@@ -0,0 +1,30 @@
+import pytest
+
+import databaseOperate
+import engagement
+import main
+import responseCache
+
+@pytest.fixture
+def counter(stub_db, monkeypatch):
+    # 只有文章 1 存在
+    stub_db.results[databaseOperate.get_post_by_id] = lambda post_id: (
+        {"id": 1, "title": "一隻貓在睡覺"} if post_id == 1 else None
+    )
+    counter = engagement.ViewCounter()
+    monkeypatch.setattr(main, "response_cache", responseCache.ResponseCache(maxsize=10))
+    monkeypatch.setattr(main, "view_counter", counter)
+    return counter
+
+def test_missing_post_is_not_counted(client, counter):
+    assert client.get("/api/posts/999").status_code == 404
+    assert counter.recorded == 0
+    assert dict(counter._pending) == {}
+
+def test_cache_hits_and_revalidations_are_counted(client, stub_db, counter):
+    first = client.get("/api/posts/1")
+    assert first.status_code == 200
+    assert client.get("/api/posts/1").status_code == 200
+    assert client.get("/api/posts/1", headers={"If-None-Match": first.headers["etag"]}).status_code == 304
+    assert stub_db.queries() == ["get_post_by_id"]
+    assert dict(counter._pending) == {1: 3}
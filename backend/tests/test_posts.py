@@ -0,0 +1,20 @@
+import pytest
+
+import databaseOperate
+
+@pytest.mark.parametrize("params", [{"limit": -1}, {"limit": 0}, {"limit": 101}, {"offset": -1}])
+def test_posts_reject_out_of_range_paging(client, stub_db, params):
+    assert client.get("/api/posts", params=params).status_code == 422
+    assert stub_db.calls == []
+
+def test_posts_pass_limit_through(client, stub_db):
+    stub_db.results[databaseOperate.get_all_posts] = []
+    assert client.get("/api/posts", params={"limit": 100}).status_code == 200
+    assert stub_db.queries(databaseOperate.get_all_posts)[0][0] == 100
+
+def test_cursor_query_seeks_instead_of_offset():
+    cursor = databaseOperate.encode_cursor("2024-03-05T10:20:30+00:00", 42)
+    sql, params = databaseOperate._posts_query(20, 0, cursor, None, None, "any", "summary", "new")
+    assert "OFFSET" not in sql.text
+    assert "(p.created_at, p.id) < (:c_key, :c_id)" in sql.text
+    assert params["c_id"] == 42
@@ -0,0 +1,69 @@
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import databaseOperate
+import main
+import password
+
+@pytest.mark.parametrize("path, body", [
+    ("/api/check-code", {"email": "a@example.com", "code": "000000"}),
+    ("/api/register", {"username": "u", "password": "p", "email": "a@example.com", "code": "000000"}),
+])
+def test_code_flood_is_rejected_before_db(stub_db, client, path, body):
+    limit = main.RATE_RULES["check_code_email"].limit
+    for _ in range(limit):
+        assert client.post(path, json=body).status_code == 400
+    calls = len(stub_db.calls)
+
+    for _ in range(50):
+        response = client.post(path, json=body)
+        assert response.status_code == 429
+        assert "retry-after" in response.headers
+    # 被擋下的請求不會再執行任何查詢
+    assert len(stub_db.calls) == calls
+
+def test_ip_limit_blocks_before_db_session(stub_db, client):
+    ip_limit = main.RATE_RULES["check_code_ip"].limit
+    for i in range(ip_limit):
+        # 每次換 Email，只累積 IP 的計數
+        client.post("/api/register", json={"username": "u", "password": "p",
+                                           "email": f"{i}@example.com", "code": "000000"})
+    sessions = stub_db.sessions
+
+    response = client.post("/api/check-code", json={"email": "new@example.com", "code": "000000"})
+    assert response.status_code == 429
+    # IP 限流在 db 依賴之前，連資料庫 Session 都不會建立
+    assert stub_db.sessions == sessions
+
+@pytest.fixture
+def login_user(stub_db, monkeypatch):
+    # 低強度雜湊讓測試夠快，並略過重新雜湊與最短回應時間
+    monkeypatch.setattr(main, "LOGIN_MIN_DURATION_SEC", 0)
+    monkeypatch.setattr(password.PasswordManager, "needs_rehash", staticmethod(lambda hashed: False))
+    stub_db.results[databaseOperate.get_user_by_username] = SimpleNamespace(
+        user_id=uuid.uuid4(), username="alice", created_at=datetime.now(timezone.utc),
+        password_hash=password.PasswordManager.hash_password("correct horse", 4)
+    )
+    return stub_db
+
+def test_successful_logins_do_not_use_up_the_user_limit(login_user, client):
+    for _ in range(main.RATE_RULES["login_user"].limit + 5):
+        response = client.post("/api/login", json={"name": "alice", "password": "correct horse"})
+        assert response.status_code == 200
+
+def test_failed_logins_lock_only_the_same_ip(login_user):
+    attacker = TestClient(main.app, client=("203.0.113.9", 50000))
+    owner = TestClient(main.app, client=("198.51.100.7", 50000))
+    for _ in range(main.RATE_RULES["login_user"].limit):
+        response = attacker.post("/api/login", json={"name": "alice", "password": "guess"})
+        assert response.status_code == 401
+    # 額度用完後，同一個 IP 連正確密碼也會被擋下 (不再進行 bcrypt)
+    response = attacker.post("/api/login", json={"name": "alice", "password": "correct horse"})
+    assert response.status_code == 429
+    # 帳號擁有者從自己的 IP 仍可登入
+    response = owner.post("/api/login", json={"name": "alice", "password": "correct horse"})
+    assert response.status_code == 200
@@ -0,0 +1,53 @@
+import asyncio
+
+from responseCache import ResponseCache, InvalidationBroadcaster
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+async def _workers(shared_broker, count=3):
+    caches = [ResponseCache() for _ in range(count)]
+    broadcasters = [InvalidationBroadcaster(cache, shared_broker.attach()) for cache in caches]
+    for broadcaster in broadcasters:
+        await broadcaster.start()
+    for cache in caches:
+        cache.set(("posts", 20, 0), b"[]", 60)
+        cache.set(("post", 1), b"{}", 60)
+        cache.set(("post", 2), b"{}", 60)
+    return caches, broadcasters
+
+def test_new_post_clears_lists_on_every_worker(shared_broker):
+    async def scenario():
+        caches, broadcasters = await _workers(shared_broker)
+        caches[0].invalidate_namespace("posts")
+        await _settle()
+        return caches, broadcasters
+
+    caches, broadcasters = asyncio.run(scenario())
+    assert all(cache.get(("posts", 20, 0)) is None for cache in caches)
+    # 其他命名空間不受影響
+    assert all(cache.get(("post", 1)) is not None for cache in caches)
+    assert broadcasters[0].published == 1
+    assert all(b.received == 1 for b in broadcasters)
+
+def test_new_comment_clears_the_post_on_every_worker(shared_broker):
+    async def scenario():
+        caches, _ = await _workers(shared_broker)
+        caches[1].invalidate(("post", 1))
+        await _settle()
+        return caches
+
+    caches = asyncio.run(scenario())
+    assert all(cache.get(("post", 1)) is None for cache in caches)
+    assert all(cache.get(("post", 2)) is not None for cache in caches)
+
+def test_received_invalidations_are_not_rebroadcast(shared_broker):
+    async def scenario():
+        caches, broadcasters = await _workers(shared_broker, count=2)
+        caches[0].invalidate_namespace("posts")
+        await _settle()
+        return broadcasters
+
+    broadcasters = asyncio.run(scenario())
+    assert [b.published for b in broadcasters] == [1, 0]
@@ -0,0 +1,22 @@
+import searchIndex
+
+def test_document_indexes_cjk_unigrams_and_bigrams():
+    tokens = searchIndex.tokenize("一隻貓在睡覺", unigrams=True)
+    assert "貓" in tokens
+    assert "睡覺" in tokens
+
+def test_single_character_query_matches_document():
+    document = set(searchIndex.to_document("一隻貓在睡覺").split())
+    assert set(searchIndex.to_query("貓").split()) <= document
+    assert set(searchIndex.to_query("睡覺").split()) <= document
+
+def test_multi_character_query_uses_bigrams_only():
+    # 「貓睡」沒有相鄰出現，不應因為兩個單字都在文章中就命中
+    assert searchIndex.to_query("貓睡") == "貓睡"
+    assert searchIndex.to_query("Hello 世界") == "hello 世界"
+
+def test_search_rejects_non_positive_limit(client, stub_db):
+    assert client.get("/api/search", params={"q": "貓", "limit": 0}).status_code == 422
+    assert client.get("/api/search", params={"q": "貓", "limit": 51}).status_code == 422
+    # limit 驗證失敗時不應執行查詢
+    assert stub_db.calls == []
@@ -0,0 +1,29 @@
+import pytest
+
+import server
+
+@pytest.fixture
+def uvicorn_calls(monkeypatch):
+    calls = []
+    monkeypatch.setattr(server.uvicorn, "run", lambda app, **kwargs: calls.append(kwargs))
+    monkeypatch.setattr(server.os, "cpu_count", lambda: 8)
+    for name in ("WEB_CONCURRENCY", "CHAT_BROKER", "RATE_LIMIT_BACKEND"):
+        monkeypatch.delenv(name, raising=False)
+    return calls
+
+def test_explicit_workers_with_memory_state_refuses_to_start(uvicorn_calls, monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    monkeypatch.setenv("CHAT_BROKER", "postgres")
+    with pytest.raises(SystemExit, match="RATE_LIMIT_BACKEND"):
+        server.main()
+    assert uvicorn_calls == []
+
+def test_default_workers_fall_back_to_one(uvicorn_calls):
+    server.main()
+    assert uvicorn_calls[0]["workers"] == 1
+
+def test_shared_backends_allow_many_workers(uvicorn_calls, monkeypatch):
+    monkeypatch.setenv("CHAT_BROKER", "postgres")
+    monkeypatch.setenv("RATE_LIMIT_BACKEND", "redis")
+    server.main()
+    assert uvicorn_calls[0]["workers"] == 8
@@ -0,0 +1,92 @@
+import asyncio
+import threading
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from sessionCache import SessionCache, RevocationBroadcaster
+
+def _row():
+    return SimpleNamespace(user_id="u1", username="alice", created_at=datetime.now(timezone.utc))
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def test_logout_on_one_worker_invalidates_the_others(shared_broker):
+    async def scenario():
+        workers = [SessionCache(expire_sec=86400) for _ in range(3)]
+        broadcasters = [RevocationBroadcaster(cache, shared_broker.attach()) for cache in workers]
+        for broadcaster in broadcasters:
+            await broadcaster.start()
+        for cache in workers:
+            cache.set("token", _row())
+
+        workers[0].invalidate("token")
+        await _settle()
+        results = [cache.get("token") for cache in workers]
+        for broadcaster in broadcasters:
+            await broadcaster.close()
+        return results, broadcasters
+
+    results, broadcasters = asyncio.run(scenario())
+    assert results == [(False, None)] * 3
+    assert broadcasters[0].published == 1
+    assert all(b.received == 1 for b in broadcasters)
+
+def test_invalidate_from_another_thread_is_broadcast(shared_broker):
+    async def scenario():
+        local, remote = SessionCache(expire_sec=86400), SessionCache(expire_sec=86400)
+        for cache in (local, remote):
+            await RevocationBroadcaster(cache, shared_broker.attach()).start()
+        remote.set("token", _row())
+        # 同步查詢函式 (例如 get_db 的 threadpool) 中呼叫 invalidate
+        thread = threading.Thread(target=local.invalidate, args=("token",))
+        thread.start()
+        thread.join()
+        await _settle()
+        return remote.get("token")
+
+    assert asyncio.run(scenario()) == (False, None)
+
+def test_local_only_invalidation_is_not_broadcast(shared_broker):
+    async def scenario():
+        local, remote = SessionCache(expire_sec=86400), SessionCache(expire_sec=86400)
+        for cache in (local, remote):
+            await RevocationBroadcaster(cache, shared_broker.attach()).start()
+        remote.set("token", _row())
+        local.invalidate("token", broadcast=False)
+        await _settle()
+        return remote.get("token")
+
+    assert asyncio.run(scenario())[0] is True
+
+def test_lookup_finishing_after_logout_does_not_recache_the_token():
+    cache = SessionCache(expire_sec=86400)
+    # 查詢在登出 commit 前讀到 Session，登出 (invalidate) 後才寫回快取
+    row = _row()
+    cache.invalidate("token")
+    cache.set("token", row)
+    assert cache.get("token") == (False, None)
+    assert cache.stats()["stale_sets"] == 1
+    # 查無資料的結果照常快取
+    cache.set("token", None)
+    assert cache.get("token") == (True, None)
+
+def test_tombstone_expires():
+    cache = SessionCache(expire_sec=86400, revoked_ttl=0)
+    cache.invalidate("token")
+    cache.set("token", _row())
+    assert cache.get("token")[0] is True
+
+def test_remote_revocation_also_leaves_a_tombstone(shared_broker):
+    async def scenario():
+        local, remote = SessionCache(expire_sec=86400), SessionCache(expire_sec=86400)
+        for cache in (local, remote):
+            await RevocationBroadcaster(cache, shared_broker.attach()).start()
+        local.invalidate("token")
+        await _settle()
+        # 其他 worker 上進行中的查詢晚一步完成
+        remote.set("token", _row())
+        return remote.get("token")
+
+    assert asyncio.run(scenario()) == (False, None)
@@ -0,0 +1,100 @@
+import asyncio
+import os
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import spyder
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "ptt")
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def ptt_site():
+    """
+    以本機 HTTP 伺服器提供 fixtures/ptt 下的 HTML (SimpleHTTPRequestHandler 會送 Last-Modified，也支援 304)
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory=FIXTURES))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+def _run(base_url, validators=None, write=None, dry_run=True):
+    async def scenario():
+        fetcher = spyder.Fetcher(per_host=2, validators=validators)
+        pipeline = spyder.IngestPipeline(fetcher, "Test", pages=5, board_id=1, workers=2,
+                                         batch_size=2, dry_run=dry_run, base_url=base_url)
+        if write is not None:
+            pipeline._write = write
+        try:
+            return await asyncio.wait_for(pipeline.run(), timeout=10), fetcher.validators
+        finally:
+            await fetcher.close()
+    return asyncio.run(scenario())
+
+def test_dry_run_crawls_fixture_board(ptt_site):
+    written = []
+
+    async def collect(batch):
+        written.extend(batch)
+
+    report, validators = _run(ptt_site, write=collect)
+    assert report["pages"] == 5  # 2 個索引頁 + 3 篇文章
+    assert report["articles"] == 3
+    # 第三篇是 404 頁面 (沒有 #main-content)，不會產生文章
+    assert report["parsed"] == 2
+    assert report["errors"] == 0
+
+    posts = {post.source_url.rsplit("/", 1)[1]: post for post in written}
+    cat = posts["M.1709605230.A.001.html"]
+    assert cat.title == "[問卦] 一隻貓在睡覺"
+    assert cat.tags == ["ptt", "Test"]
+    assert cat.created_at.isoformat() == "2024-03-05T10:20:30+08:00"
+    assert "<p>一隻貓在睡覺，</p>" in cat.content
+    # 推文與簽名檔不會進入內文
+    assert "不要吵牠" not in cat.content
+    assert "發信站" not in cat.content
+    assert "&lt;script&gt;" in posts["M.1709608830.A.002.html"].content
+
+def test_unchanged_pages_are_not_parsed_again(ptt_site):
+    async def discard(batch):
+        pass
+
+    _, validators = _run(ptt_site, write=discard)
+    report, _ = _run(ptt_site, validators=validators, write=discard)
+    # 兩個索引頁都回 304，沿用上次記錄的上一頁連結，不再抓文章
+    assert report["not_modified"] == 2
+    assert report["articles"] == 0
+
+def test_writer_failure_stops_the_pipeline(ptt_site):
+    async def scenario():
+        fetcher = spyder.Fetcher(per_host=2)
+        pipeline = spyder.IngestPipeline(fetcher, "Test", pages=1, board_id=1, workers=2,
+                                         batch_size=2, base_url=ptt_site)
+
+        async def crawl_many(articles):
+            # 文章數遠多於 rows 佇列的容量：寫入端停掉後上游一定會卡在 put()
+            # (網址各不相同，才不會因為條件式 GET 回 304 而略過)
+            link = f"{ptt_site}/bbs/Test/M.1709605230.A.001.html"
+            for i in range(50):
+                await articles.put((f"{link}?n={i}", "貓"))
+
+        async def fail(batch):
+            raise ConnectionError("database went away")
+
+        pipeline._crawl_index = crawl_many
+        pipeline._write = fail
+        try:
+            await asyncio.wait_for(pipeline.run(), timeout=10)
+        finally:
+            await fetcher.close()
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(scenario())
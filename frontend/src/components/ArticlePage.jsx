@@ -78,15 +78,14 @@ function Article( { boardIds } ) {
                                 <span className="author-name">@{post.author.name}</span>
                             </div>
 
-                            {/* 內容預覽 (HTML) */}
+                            {/* 內容預覽 (後端提供的純文字摘要) */}
                             {/* 限制高度，只顯示一部分 */}
                             <div 
                                 className="card-content-preview ql-snow"
                             >
-                                <div 
-                                    className="ql-editor"
-                                    dangerouslySetInnerHTML={{ __html: post.content }} 
-                                />
+                                <div className="ql-editor">
+                                    <p>{post.excerpt}{post.content_length > post.excerpt?.length ? "…" : ""}</p>
+                                </div>
                             </div>
 
                             {/* 底部：標籤 */}
@@ -0,0 +1,3 @@
+-- 文章列表 keyset 分頁：讓 (created_at, id) 的 seek 條件與排序都能直接走索引
+DROP INDEX IF EXISTS public.idx_posts_created_at;
+CREATE INDEX idx_posts_created_at ON public.posts USING btree (created_at DESC, id DESC);
@@ -0,0 +1,4 @@
+-- 全文檢索：search_vector 由應用程式寫入 (CJK 先切成 bigram 再以 'simple' 建立)
+-- 既有資料請執行 python backend/searchIndex.py 分批補建
+ALTER TABLE public.posts ADD COLUMN IF NOT EXISTS search_vector tsvector;
+CREATE INDEX IF NOT EXISTS idx_posts_search ON public.posts USING gin (search_vector);
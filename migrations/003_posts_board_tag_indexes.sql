@@ -0,0 +1,4 @@
+-- 看板篩選：同時支援 board_id 等值條件與 (created_at, id) 的 keyset 分頁排序
+CREATE INDEX IF NOT EXISTS idx_posts_board_created ON public.posts USING btree (board_id, created_at DESC, id DESC);
+-- 標籤篩選：jsonb_ops 同時支援 ?| (任一標籤) 與 @> (全部標籤)
+CREATE INDEX IF NOT EXISTS idx_posts_tags ON public.posts USING gin (tags);
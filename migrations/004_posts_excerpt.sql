@@ -0,0 +1,9 @@
+-- 文章列表摘要：列表查詢只讀 excerpt / content_length，不必讀出 (可能已 TOAST 的) 完整 content
+ALTER TABLE public.posts ADD COLUMN IF NOT EXISTS excerpt text;
+ALTER TABLE public.posts ADD COLUMN IF NOT EXISTS content_length integer;
+
+-- 既有資料：以正規表示式粗略去除 HTML 標籤 (新文章由應用程式寫入)
+UPDATE public.posts
+SET excerpt = left(btrim(regexp_replace(regexp_replace(content, '<[^>]+>', ' ', 'g'), '\s+', ' ', 'g')), 200),
+    content_length = char_length(content)
+WHERE excerpt IS NULL;
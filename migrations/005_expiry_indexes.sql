@@ -0,0 +1,3 @@
+-- 過期資料清除：讓依時間挑選過期資料列的子查詢走索引
+CREATE INDEX IF NOT EXISTS idx_sessions_created_at ON public.user_sessions USING btree (created_at);
+CREATE INDEX IF NOT EXISTS idx_email_verifications_expires ON public.email_verifications USING btree (expires_at);
@@ -0,0 +1,8 @@
+-- 每位使用者只保留一個 Session，讓登入可以用 ON CONFLICT (user_id) 一次完成取代
+-- 先清掉重複的舊資料 (保留最新的一筆)
+DELETE FROM public.user_sessions s
+USING public.user_sessions newer
+WHERE s.user_id = newer.user_id
+  AND (s.created_at, s.session_id) < (newer.created_at, newer.session_id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_sessions_user_id ON public.user_sessions USING btree (user_id);
@@ -0,0 +1,19 @@
+-- 留言 (支援巢狀回覆)：path 為各層祖先 id 補零後以 / 串接 (materialized path)
+-- 使用 COLLATE "C" 讓 path 依位元組排序，子樹查詢可直接做索引範圍掃描
+CREATE TABLE IF NOT EXISTS public.comments (
+    id bigserial PRIMARY KEY,
+    post_id integer NOT NULL REFERENCES public.posts(id) ON DELETE CASCADE,
+    parent_id bigint REFERENCES public.comments(id) ON DELETE CASCADE,
+    user_id uuid NOT NULL REFERENCES public.users(user_id) ON DELETE CASCADE,
+    path text COLLATE "C" NOT NULL,
+    depth integer NOT NULL,
+    content text NOT NULL,
+    created_at timestamp with time zone DEFAULT CURRENT_TIMESTAMP
+);
+
+ALTER TABLE public.comments OWNER TO chichi;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_comments_post_path ON public.comments USING btree (post_id, path);
+
+-- 文章列表直接讀取留言數，不必 JOIN / COUNT(*)
+ALTER TABLE public.posts ADD COLUMN IF NOT EXISTS comment_count integer NOT NULL DEFAULT 0;
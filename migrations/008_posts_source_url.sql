@@ -0,0 +1,6 @@
+-- 爬蟲匯入的文章記錄來源網址，並以網址雜湊 (blake2b 16 bytes) 去重
+-- 一般發文這兩欄為 NULL，唯一索引不受影響
+ALTER TABLE public.posts ADD COLUMN IF NOT EXISTS source_url text;
+ALTER TABLE public.posts ADD COLUMN IF NOT EXISTS source_url_hash bytea;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_posts_source_url_hash ON public.posts USING btree (source_url_hash);
@@ -0,0 +1,12 @@
+-- 大量匯入 (bulkPosts.py) 的斷點：每個 chunk 匯入時在同一個交易內更新，中斷後從 byte_offset 繼續
+CREATE TABLE IF NOT EXISTS public.bulk_import_checkpoints (
+    job text PRIMARY KEY,
+    source text NOT NULL,
+    byte_offset bigint NOT NULL DEFAULT 0,
+    rows_read bigint NOT NULL DEFAULT 0,
+    rows_imported bigint NOT NULL DEFAULT 0,
+    rows_skipped bigint NOT NULL DEFAULT 0,
+    updated_at timestamp with time zone DEFAULT CURRENT_TIMESTAMP
+);
+
+ALTER TABLE public.bulk_import_checkpoints OWNER TO chichi;
@@ -0,0 +1,11 @@
+-- 瀏覽數 (由 engagement.ViewCounter 定期批次寫回) 與熱門排序分數
+-- hot_score = log10(max(view_count, 1)) + epoch(created_at) / 45000，與 databaseOperate.hot_score_sql 相同
+ALTER TABLE public.posts ADD COLUMN IF NOT EXISTS view_count bigint NOT NULL DEFAULT 0;
+ALTER TABLE public.posts ADD COLUMN IF NOT EXISTS hot_score double precision NOT NULL DEFAULT 0;
+
+UPDATE public.posts
+SET hot_score = log(greatest(view_count, 1)) + COALESCE(extract(epoch from created_at), 0) / 45000;
+
+-- 熱門列表與 created_at 列表一樣走 keyset 索引掃描
+CREATE INDEX IF NOT EXISTS idx_posts_hot ON public.posts USING btree (hot_score DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_posts_board_hot ON public.posts USING btree (board_id, hot_score DESC, id DESC);
@@ -0,0 +1,9 @@
+-- content_length 改為純文字長度 (與 excerpt 同樣去除 HTML 標籤、合併空白)，
+-- 前端以 content_length > excerpt 長度判斷摘要是否被截斷；原本存的是 HTML 長度，幾乎每篇都會被當成截斷
+-- 既有資料以正規表示式換算，常見的 HTML 實體換成單一字元 (新文章由應用程式以 searchIndex.html_to_text 計算)
+UPDATE public.posts
+SET content_length = char_length(btrim(regexp_replace(
+        replace(replace(replace(replace(replace(replace(
+            regexp_replace(content, '<[^>]+>', ' ', 'g'),
+            '&nbsp;', ' '), '&lt;', '<'), '&gt;', '>'), '&quot;', '"'), '&#39;', ''''), '&amp;', '&'),
+        '\s+', ' ', 'g')));